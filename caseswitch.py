@@ -8,14 +8,30 @@
 # The newest version of this module should be downloadable from:
 # https://github.com/zuo/Zuo-s-Recipes-and-Drafts/blob/master/caseswitch.py
 
+from array import array
+from bisect import bisect_right
 from collections import defaultdict
 import inspect
+import sys
+import time
 
 try: xrange
 except NameError:
     xrange = range  # Py3.x
 
-__all__ = 'with_switch', 'case', 'list_switch_factory', 'SwitchMeta', 'Switch'
+try:
+    import abc
+    _ABC_META = abc.ABCMeta
+except ImportError:  # Py2.5
+    abc = None
+    _ABC_META = ()  # (isinstance(x, ()) is always False)
+
+__all__ = ('with_switch', 'case', 'ANY', 'list_switch_factory',
+           'byte_switch_factory', 'compact_switch_factory',
+           'generated_switch_factory', 'type_switch_factory',
+           'interval_switch_factory', 'perfect_hash_switch_factory',
+           'tuple_switch_factory', 'adaptive_switch_factory',
+           'SwitchMeta', 'Switch')
 
 
 #
@@ -27,41 +43,667 @@ class _DefaultCaseKey(object):
 
 _DEF_CASE_KEY = _DefaultCaseKey()
 
+class _Interval(object):
+    """Interval case key: [low, high) (half-open)."""
+    def __init__(self, low, high):
+        if not low < high:
+            raise ValueError('empty interval: [%r, %r)' % (low, high))
+        self.low = low
+        self.high = high
+    def __eq__(self, other):
+        return (isinstance(other, _Interval) and
+                (self.low, self.high) == (other.low, other.high))
+    def __ne__(self, other):
+        return not self == other
+    def __hash__(self):
+        return hash((_Interval, self.low, self.high))
+    def __repr__(self):
+        return '<interval [%r, %r)>' % (self.low, self.high)
+
+class _Wildcard(object):
+    def __repr__(self):
+        return 'ANY'
+
+def _is_wildcard_key(key):
+    return isinstance(key, tuple) and any(k is ANY for k in key)
+
+def _specificity(key):
+    # (exact components win; the leftmost ones first)
+    return tuple(k is not ANY for k in key)
+
+class _WildcardDict(dict):
+    """One dimension of a tuple switch: value -> subtable (or case)."""
+    def __init__(self, children, wild):
+        dict.__init__(self, children)
+        self.wild = wild
+    def __missing__(self, value):
+        return self.wild
+
+def _build_tuple_table(rules, dim, lengths, default_case):
+    # rules: [(key, case), ...] -- the ones matching the path so far
+    if dim == len(lengths):
+        if not rules:
+            return default_case
+        return max(rules, key=(lambda rule: _specificity(rule[0])))[1]
+    wild_rules = [rule for rule in rules if rule[0][dim] is ANY]
+    wild = _build_tuple_table(wild_rules, dim + 1, lengths, default_case)
+    children = {}
+    for key, case in rules:
+        value = key[dim]
+        if value is not ANY and value not in children:
+            children[value] = _build_tuple_table(
+                [rule for rule in rules
+                 if rule[0][dim] is ANY or rule[0][dim] == value],
+                dim + 1, lengths, default_case)
+    length = lengths[dim]
+    if length is None:
+        return _WildcardDict(children, wild)
+    table = [wild] * (length + 1)  # (table[length]: for any other value)
+    for value, child in children.items():
+        table[value] = child
+    return table
+
+def _make_tuple_lookup(root, lengths):
+    width = len(lengths)
+    key_names = ', '.join(['k%d' % dim for dim in xrange(width)])
+    if width == 1:
+        key_names += ','
+    lines = ['def lookup(key):',
+             '    %s = key' % key_names,
+             '    table = _root']
+    for dim, length in enumerate(lengths):
+        if length is None:
+            lines.append('    table = table[k%d]' % dim)
+        else:
+            lines.append('    table = table[k%d if type(k%d) in _INT_TYPES '
+                         'and 0 <= k%d < %d else _index(k%d, %d)]'
+                         % (dim, dim, dim, length, dim, length))
+    lines.append('    return table')
+    source = '\n'.join(lines) + '\n'
+    namespace = {'_root': root, '_INT_TYPES': _INT_TYPES,
+                 '_index': _tuple_table_index}
+    exec(compile(source, '<caseswitch tuple lookup>', 'exec'), namespace)
+    return namespace['lookup'], source
+
+def _tuple_table_index(value, length):
+    # (the slow path: e.g. True or 2.0 -- equal to an int, as for a dict)
+    try:
+        int_value = int(value)
+    except (TypeError, ValueError, OverflowError):
+        return length
+    if int_value == value and 0 <= int_value < length:
+        return int_value
+    return length  # (<- the wildcard subtable)
+
+def _make_intervals(range_arg):
+    # range_arg: (low, high) or a sequence of such pairs
+    if range_arg and isinstance(range_arg[0], (tuple, list)):
+        return [_Interval(low, high) for low, high in range_arg]
+    low, high = range_arg
+    return [_Interval(low, high)]
+
+class _CompactSwitch(object):
+    """Integer keys -> cases, via an offset array of indexes of cases."""
+    __slots__ = 'offset', 'length', 'indexes', 'cases'
+    def __init__(self, offset, length, indexes, cases):
+        self.offset = offset
+        self.length = length
+        self.indexes = indexes  # array of indexes in `cases`
+        self.cases = cases      # distinct cases; cases[0] -- the default
+    def __getitem__(self, key):
+        if type(key) not in _INT_TYPES:
+            # (e.g. 2.0 or True -- equal to an int key, as for a dict)
+            try:
+                int_key = int(key)
+            except (TypeError, ValueError, OverflowError):
+                return self.cases[0]
+            if int_key != key:
+                return self.cases[0]
+            key = int_key
+        index = key - self.offset
+        if 0 <= index < self.length:
+            return self.cases[self.indexes[index]]
+        return self.cases[0]
+
+def _group_positions(keys):
+    """Get a list of (key, positions) pairs (positions: list or array)."""
+    numpy = sys.modules.get('numpy')
+    if (numpy is not None and isinstance(keys, numpy.ndarray)
+          and keys.dtype.kind in 'iu'):
+        unique_keys, inverse = numpy.unique(keys, return_inverse=True)
+        inverse = inverse.ravel()
+        order = numpy.argsort(inverse, kind='stable')
+        counts = numpy.bincount(inverse, minlength=len(unique_keys))
+        ends = numpy.cumsum(counts)
+        starts = ends - counts
+        return [(key, order[start:end]) for key, start, end
+                in zip(unique_keys.tolist(), starts, ends)]
+    keys_to_positions = {}
+    for position, key in enumerate(keys):
+        try:
+            keys_to_positions[key].append(position)
+        except KeyError:
+            keys_to_positions[key] = [position]
+    return list(keys_to_positions.items())
+
+def _dispatch_many(cls, keys, items):
+    if len(keys) != len(items):
+        raise ValueError('got %d keys but %d items'
+                         % (len(keys), len(items)))
+    switch = cls.switch
+    case_ids_to_groups = {}  # id(case) -> [case, [positions, ...]]
+    for key, positions in _group_positions(keys):
+        case = switch[key]
+        if case is None:
+            raise KeyError(key)
+        group = case_ids_to_groups.setdefault(id(case), [case, []])
+        group[1].append(positions)
+    numpy = sys.modules.get('numpy')
+    items_is_array = numpy is not None and isinstance(items, numpy.ndarray)
+    results = [None] * len(items)
+    for case, positions_list in case_ids_to_groups.values():
+        if len(positions_list) == 1:
+            positions = positions_list[0]
+        elif items_is_array or not isinstance(positions_list[0], list):
+            positions = numpy.concatenate(positions_list)
+        else:
+            positions = [position for positions in positions_list
+                         for position in positions]
+        if items_is_array:
+            case_items = items[positions]
+        else:
+            case_items = [items[position] for position in positions]
+        if getattr(case, '_switch_case_batch', False):
+            case_results = case(case_items)
+            if len(case_results) != len(case_items):
+                raise ValueError('batch case %r returned %d results '
+                                 'for %d items' % (case, len(case_results),
+                                                   len(case_items)))
+        else:
+            case_results = [case(item) for item in case_items]
+        for position, result in zip(positions, case_results):
+            results[position] = result
+    return results
+
+def _function_switch(lookup, **attrs):
+    """Make a switch object whose `switch[key]` calls lookup(key)."""
+    attrs.update({
+        '__slots__': (),
+        '__getitem__': staticmethod(lookup),
+        'lookup': staticmethod(lookup),
+    })
+    return type('FunctionSwitch', (object,), attrs)()
+
+def _make_perfect_hash_lookup(displacements, keys, cases, default):
+    bucket_count = len(displacements)
+    size = len(keys)
+    def lookup(key):
+        h = hash(key)
+        slot = (h ^ displacements[h % bucket_count]) % size
+        if keys[slot] == key:  # (the only equality check)
+            return cases[slot]
+        return default
+    return lookup
+
+_HASH_MIXER = 0x9E3779B1  # (golden ratio based multiplier)
+
+def _find_perfect_hash(hashes, size, maxtries):
+    """Get (bucket XOR masks, {slot: key index}), or None if not found."""
+    bucket_count = len(hashes)
+    buckets = [[] for i in xrange(bucket_count)]
+    for index, h in enumerate(hashes):
+        buckets[h % bucket_count].append(index)
+    displacements = [0] * bucket_count
+    occupied = {}  # slot -> index of key
+    for bucket_index in sorted(xrange(bucket_count),
+                               key=(lambda i: -len(buckets[i]))):
+        bucket = buckets[bucket_index]
+        if not bucket:
+            break
+        for attempt in xrange(maxtries):
+            mask = attempt * _HASH_MIXER
+            slots = [(hashes[index] ^ mask) % size for index in bucket]
+            if (len(set(slots)) == len(slots) and
+                  not any(slot in occupied for slot in slots)):
+                break
+        else:
+            return None
+        displacements[bucket_index] = mask
+        for slot, index in zip(slots, bucket):
+            occupied[slot] = index
+    return displacements, occupied
+
+class _ByteSwitch(list):
+    """256 cases (index: byte value) + the run() interpreter loop."""
+    def run(self, buffer, offset=0, end=None):
+        """
+        Decode `buffer` (bytes, bytearray, memoryview...) opcode by opcode.
+
+        For each opcode (the byte at the current offset) its case is
+        called: case(view, offset) -- `view` is a memoryview of the buffer
+        (on Py2: a bytearray; there `str` buffers are copied) -- and must
+        return the number of bytes consumed (including the opcode), or
+        0/None to stop.  Returns the offset at which decoding stopped.
+        """
+        if _BYTES_INDEXED_AS_INTS:
+            view = memoryview(buffer)
+            if view.format != 'B':
+                view = view.cast('B')
+        else:
+            view = buffer if isinstance(buffer, bytearray) else bytearray(
+                buffer)
+        if end is None:
+            end = len(view)
+        table = self
+        while offset < end:
+            consumed = table[view[offset]](view, offset)
+            if not consumed:
+                break
+            offset += consumed
+        return offset
+
+def _byte_key(key):
+    if isinstance(key, _INT_TYPES) and 0 <= key <= 255:
+        return key
+    if isinstance(key, _CHAR_TYPES) and len(key) == 1 and ord(key) <= 255:
+        return ord(key)
+    raise ValueError('not a byte/opcode key: %r' % (key,))
+
+class _IntervalSwitch(dict):
+    """Exact keys -> cases dict; on a miss: interval lookup (bisect)."""
+    def __init__(self, exact_keys_to_cases, boundaries, region_cases):
+        dict.__init__(self, exact_keys_to_cases)
+        self.boundaries = boundaries
+        self.region_cases = region_cases
+    def __missing__(self, key):
+        try:
+            return self.region_cases[bisect_right(self.boundaries, key)]
+        except TypeError:  # (Py3.x: key not comparable with boundaries)
+            return self.region_cases[0]
+
+class _TypeSwitch(dict):
+    """Types -> cases (a cache); on a miss: MRO walk (then cached)."""
+    def __init__(self, types_to_cases, default_case):
+        dict.__init__(self)
+        self.declared = {}
+        self.abc_types = []
+        self.default_case = default_case
+        for cls, case in types_to_cases.items():
+            self.register(cls, case)
+    def register(self, cls, case):
+        """Add (or replace) the case for type `cls`; clear the cache."""
+        if not inspect.isclass(cls):
+            raise TypeError('not a type/class key: %r' % (cls,))
+        self.declared[cls] = case
+        if isinstance(cls, _ABC_META) and cls not in self.abc_types:
+            self.abc_types.append(cls)
+            self.__class__ = _ABCTypeSwitch
+        self.clear_cache()
+    def clear_cache(self):
+        """Forget resolved types (needed e.g. after SomeABC.register())."""
+        self.clear()
+        self.update(self.declared)
+        self.abc_token = _abc_cache_token()
+    def dispatch(self, obj):
+        """Get the case for type(obj)."""
+        return self[type(obj)]
+    def __missing__(self, cls):
+        if not inspect.isclass(cls):
+            raise TypeError('not a type/class: %r (the switch is to be '
+                            'indexed with type(obj) -- or use dispatch(obj))'
+                            % (cls,))
+        declared = self.declared
+        for base in inspect.getmro(cls):
+            if base in declared:
+                case = declared[base]
+                break
+        else:
+            case = self._resolve_virtual(cls)
+        self[cls] = case
+        return case
+    def _resolve_virtual(self, cls):
+        # ABCs the type is a (virtual) subclass of, but not in its MRO
+        matches = [abc_type for abc_type in self.abc_types
+                   if issubclass(cls, abc_type)]
+        matches = [abc_type for abc_type in matches
+                   if not any(other is not abc_type
+                              and issubclass(other, abc_type)
+                              for other in matches)]
+        if len(matches) > 1:
+            raise TypeError('ambiguous dispatch for %r: %s' % (
+                cls, ', '.join(sorted(map(repr, matches)))))
+        if matches:
+            return self.declared[matches[0]]
+        return self.default_case
+
+class _ABCTypeSwitch(_TypeSwitch):
+    """_TypeSwitch (with ABC keys) that notices later ABC registrations."""
+    def __getitem__(self, cls):
+        if self.abc_token != _abc_cache_token():
+            self.clear_cache()
+        return _TypeSwitch.__getitem__(self, cls)
+
+try:
+    _abc_cache_token = abc.get_cache_token
+except AttributeError:  # Py<3.4
+    def _abc_cache_token():
+        return getattr(_ABC_META, '_abc_invalidation_counter', None)
+
+try:
+    _INT_TYPES = (int, long)
+    _LITERAL_TYPES = (int, long, float, str, unicode, bool, type(None))
+    _CHAR_TYPES = (str, unicode)
+    _BYTES_INDEXED_AS_INTS = False
+except NameError:  # Py3.x
+    _INT_TYPES = (int,)
+    _LITERAL_TYPES = (int, float, str, bytes, bool, type(None))
+    _CHAR_TYPES = (bytes, str)
+    _BYTES_INDEXED_AS_INTS = True  # (bytes/memoryview items are ints)
+
+_MATCH_SUPPORTED = sys.version_info >= (3, 10)
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+def _literal_repr(key):
+    """Return repr(key) if it can be used in source code, else None."""
+    if type(key) in _LITERAL_TYPES:
+        key_repr = repr(key)
+        try:
+            if eval(key_repr, {}) == key:
+                return key_repr
+        except Exception:
+            pass
+    return None
+
+def _gen_chain(lines, indent, case_names_to_keys, key_exprs):
+    for case_name, keys in case_names_to_keys:
+        if len(keys) == 1:
+            condition = 'key == %s' % key_exprs[keys[0]]
+        else:
+            condition = 'key in (%s)' % ', '.join(
+                key_exprs[key] for key in keys)
+        lines.append('%sif %s: return %s' % (indent, condition, case_name))
+    lines.append('%sreturn _default' % indent)
+
+def _gen_tree(lines, indent, sorted_keys, keys_to_names, key_exprs, leafsize):
+    if len(sorted_keys) <= leafsize:
+        _gen_chain(lines, indent,
+                   [(keys_to_names[key], [key]) for key in sorted_keys],
+                   key_exprs)
+    else:
+        middle = len(sorted_keys) // 2
+        lines.append('%sif key < %s:' % (indent,
+                                          key_exprs[sorted_keys[middle]]))
+        _gen_tree(lines, indent + '    ', sorted_keys[:middle],
+                  keys_to_names, key_exprs, leafsize)
+        _gen_tree(lines, indent, sorted_keys[middle:],
+                  keys_to_names, key_exprs, leafsize)
+
+def _gen_match(lines, indent, case_names_to_keys, key_exprs):
+    lines.append('%smatch key:' % indent)
+    for case_name, keys in case_names_to_keys:
+        lines.append('%s    case %s: return %s' % (
+            indent, ' | '.join(key_exprs[key] for key in keys), case_name))
+    lines.append('%s    case _: return _default' % indent)
+
+def _generate_switch(shape, default_case, keys_to_cases, leafsize,
+                     key_order=None):
+    # key_order: keys in the order of their tests (default: dict order)
+    namespace = {'_default': default_case}
+    case_names_to_keys = []  # [(case name, [key, ...]), ...]
+    keys_to_names = {}
+    case_ids_to_names = {}
+    key_exprs = {}
+    if key_order is None:
+        key_order = list(keys_to_cases)
+    for i, key in enumerate(key_order):
+        case = keys_to_cases[key]
+        case_name = case_ids_to_names.get(id(case))
+        if case_name is None:
+            case_name = case_ids_to_names[id(case)] = '_case%d' % len(
+                case_ids_to_names)
+            namespace[case_name] = case
+            case_names_to_keys.append((case_name, []))
+        case_names_to_keys[int(case_name[5:])][1].append(key)
+        keys_to_names[key] = case_name
+        key_exprs[key] = _literal_repr(key)
+        if key_exprs[key] is None:
+            if shape == 'match':
+                raise ValueError('the %r key cannot be used in a match '
+                                 'statement (not a literal)' % (key,))
+            key_exprs[key] = '_key%d' % i
+            namespace[key_exprs[key]] = key
+    lines = ['def lookup(key):']
+    if shape == 'if':
+        _gen_chain(lines, '    ', case_names_to_keys, key_exprs)
+    elif shape == 'tree':
+        # (keys of other types -- maybe not comparable with the declared
+        # ones, maybe equal to some of them, e.g. 2.0 -- are tested with
+        # `==`, as a dict would do; only then the default case is used)
+        namespace['_key_types'] = frozenset(map(type, keys_to_cases))
+        lines.append('    if type(key) not in _key_types:')
+        _gen_chain(lines, '        ', case_names_to_keys, key_exprs)
+        _gen_tree(lines, '    ', sorted(keys_to_cases), keys_to_names,
+                  key_exprs, leafsize)
+    else:
+        _gen_match(lines, '    ', case_names_to_keys, key_exprs)
+    source = '\n'.join(lines) + '\n'
+    exec(compile(source, '<caseswitch %s-shaped lookup>' % shape, 'exec'),
+         namespace)
+    return _function_switch(namespace['lookup'], shape=shape, source=source)
+
+class _AdaptiveSwitch(dict):
+    """Keys -> cases dict that samples looked-up keys (see: adapt())."""
+    def __init__(self, get_default_case, keys_to_cases, warmup, maxchain):
+        dict.__init__(self, keys_to_cases)
+        self.get_default_case = get_default_case
+        self.default_case = get_default_case()
+        self.warmup = warmup
+        self.maxchain = maxchain
+        self.samples = []
+        self.owner = None  # (set by with_switch: the class to update)
+        self.backend = None
+        self.reason = 'not adapted yet (warm-up: %d lookups)' % warmup
+        self.timings = {}
+    def __missing__(self, key):
+        return self.default_case
+    def __getitem__(self, key):
+        case = dict.__getitem__(self, key)
+        samples = self.samples
+        samples.append(key)
+        if len(samples) >= self.warmup:
+            self.adapt()
+        return case
+    def adapt(self):
+        """Choose the backend (using the samples), swap owner.switch."""
+        if self.backend is not None:
+            return
+        # (from now on: no sampling; old references work as a plain dict)
+        self.__class__ = _AdaptedSwitch
+        samples = self.samples
+        self.samples = []
+        if not samples:
+            samples = list(self)
+        candidates = _adaptive_candidates(
+            self.get_default_case, dict(self), samples, self.maxchain)
+        timed = [(_lookup_time(switch, samples), i, name, switch)
+                 for i, (name, switch) in enumerate(candidates)]
+        timed.sort()
+        self.timings = dict((name, t) for t, i, name, switch in timed)
+        self.backend = timed[0][2]
+        self.reason = '%s: the fastest lookups of %d sampled keys (%s)' % (
+            self.backend, len(samples),
+            ', '.join('%s: %fs' % (name, t) for t, i, name, switch in timed))
+        if self.owner is not None:
+            self.owner.switch = timed[0][3]  # (an atomic swap)
+
+class _AdaptedSwitch(_AdaptiveSwitch):
+    __getitem__ = dict.__getitem__
+
+def _adaptive_candidates(get_default_case, keys_to_cases, samples, maxchain):
+    candidates = [('dict', defaultdict(get_default_case, keys_to_cases))]
+    if keys_to_cases and all(type(key) in _INT_TYPES
+                             for key in keys_to_cases) and all(
+          type(key) in _INT_TYPES for key in samples):
+        compact = compact_switch_factory.__get__(None, object)(
+            get_default_case, keys_to_cases, mindensity=0)
+        candidates.append(('offset list', compact))
+    if 0 < len(keys_to_cases) <= maxchain:
+        frequencies = defaultdict(int)
+        for key in samples:
+            frequencies[key] += 1
+        key_order = sorted(keys_to_cases,
+                           key=(lambda key: -frequencies.get(key, 0)))
+        candidates.append(('if-chain', _generate_switch(
+            'if', get_default_case(), keys_to_cases, 0, key_order)))
+    return candidates
+
+def _add_case_keys(keys_to_cases, obj):
+    for key in getattr(obj, '_switch_case_keys', ()):
+        _obj = keys_to_cases.setdefault(key, obj)
+        if _obj is not obj:
+            raise ValueError('More than one case for key %r' % (key,))
+
+def _scan_cases(cls):
+    """Get (case members: {name: obj}, keys -> cases) -- a full scan."""
+    members = {}
+    keys_to_cases = {}
+    for name, obj in inspect.getmembers(cls):
+        if getattr(obj, '_switch_case_keys', ()):
+            members[name] = obj
+            _add_case_keys(keys_to_cases, obj)
+    return members, keys_to_cases
+
+def _extend_cases(cls, base):
+    """Like _scan_cases() but reusing the (single) base's results."""
+    members = base._switch_members.copy()
+    keys_to_cases = base._switch_keys_to_cases.copy()
+    # the class's own attributes + inherited cases that must be fetched
+    # again (those bound to the class, e.g. classmethods)
+    names = list(cls.__dict__)
+    names.extend(name for name in base._switch_rebound
+                 if name not in cls.__dict__)
+    for name in names:
+        old_obj = members.pop(name, None)
+        for key in getattr(old_obj, '_switch_case_keys', ()):
+            if keys_to_cases.get(key) is old_obj:
+                del keys_to_cases[key]
+    for name in names:
+        obj = getattr(cls, name, None)
+        if getattr(obj, '_switch_case_keys', ()):
+            members[name] = obj
+            _add_case_keys(keys_to_cases, obj)
+    return members, keys_to_cases, names
+
+def _lookup_time(switch, keys, repeat=3):
+    results = []
+    for i in xrange(repeat):
+        start = _clock()
+        for key in keys:
+            switch[key]
+        results.append(_clock() - start)
+    return min(results)
+
 
 # public classes and functions
 
 def with_switch(cls):
     """
-    Class decorator that adds two attributes to the `cls` class:
+    Class decorator that adds three public attributes to the `cls` class:
 
     * `switch` -- a defaultdict (or collection of other type, created with
-      cls.custom_switch_factory) mapping case keys to case objects (that
-      have been decorated with the @case() decorator;
+      cls.custom_switch_factory; if there are interval keys -- by default,
+      with interval_switch_factory; if there are tuple keys containing
+      ANY -- with tuple_switch_factory) mapping case keys to case objects
+      (that have been decorated with the @case() decorator;
 
     * `get_default_case` -- a static method that returns the default case
       object, i.e. one which has been decorated with @case(default=True)
-      (or returns None if no object has been decorated in that way).
+      (or returns None if no object has been decorated in that way);
+
+    * `dispatch_many` -- a class method: dispatch_many(keys, items) calls
+      -- for each key and the corresponding item (the lengths must be
+      equal) -- the key's case with the item, and returns the list of
+      results (in the input order); the items are grouped by case first,
+      and a case decorated with @case(..., batch=True) is called once --
+      with the list of its items (it must return a sequence of results,
+      one per item; otherwise ValueError is raised), other cases are
+      called for each item in a local loop.  If `keys` is a NumPy integer
+      array the grouping is done with NumPy (then `items`, if also a NumPy
+      array, is indexed with arrays of positions).
 
     Typically, case object is a callable method (but doesn't need to be).
+
+    If the switch has been created with adaptive_switch_factory, also
+    `adaptive_switch` is added (see the factory's docs; in a subclass
+    whose switch is created otherwise it is set to None).
+
+    The found cases are also kept as non-public `_switch_*` attributes:
+    if `cls` has exactly one base class, itself decorated with
+    @with_switch, only attributes from cls.__dict__ are examined (the
+    base's results are copied and extended), rather than all attributes
+    (including inherited ones) -- so creating subclasses of big switch
+    classes is cheap.
     """
-    keys_to_cases = {}
-    for name, obj in inspect.getmembers(cls):
-        for key in getattr(obj, '_switch_case_keys', ()):
-            _obj = keys_to_cases.setdefault(key, obj)
-            if _obj is not obj:
-                raise ValueError('More than one case for key %r' % key)
+    bases = cls.__bases__
+    if len(bases) == 1 and '_switch_members' in bases[0].__dict__:
+        # (a subclass of a single switch class: extending its results)
+        members, keys_to_cases, names = _extend_cases(cls, bases[0])
+        rebound = set(bases[0]._switch_rebound)
+        rebound.update(names)
+    else:
+        members, keys_to_cases = _scan_cases(cls)
+        rebound = members
+    cls._switch_members = members
+    cls._switch_keys_to_cases = keys_to_cases.copy()
+    cls._switch_rebound = [name for name in rebound if name in members
+                           and getattr(cls, name) is not members[name]]
     default_case = keys_to_cases.pop(_DEF_CASE_KEY, None)
     get_default_case = (lambda: default_case)
-    switch_factory = getattr(cls, 'custom_switch_factory', defaultdict)
+    switch_factory = getattr(cls, 'custom_switch_factory', None)
+    key_types = set(map(type, keys_to_cases))  # (cheap: C-level)
+    has_intervals = any(issubclass(t, _Interval) for t in key_types)
+    # (unwrapping the staticmethods, like getattr(cls, ...) would do)
+    if has_intervals and switch_factory not in (
+          None, interval_switch_factory.__get__(None, cls)):
+        raise ValueError('interval keys (@case(range=...)) require '
+                         'interval_switch_factory, not %s' % getattr(
+                             switch_factory, '__name__', switch_factory))
+    if switch_factory is None:
+        if has_intervals:
+            switch_factory = interval_switch_factory.__get__(None, cls)
+        elif any(issubclass(t, tuple) for t in key_types) and any(
+              _is_wildcard_key(key) for key in keys_to_cases):
+            switch_factory = tuple_switch_factory.__get__(None, cls)
+        else:
+            switch_factory = defaultdict
     kwargs = getattr(cls, 'custom_switch_factory_kwargs', {})
     cls.switch = switch_factory(get_default_case, keys_to_cases, **kwargs)
+    if isinstance(cls.switch, _AdaptiveSwitch):
+        cls.switch.owner = cls
+        cls.adaptive_switch = cls.switch
+    elif getattr(cls, 'adaptive_switch', None) is not None:
+        cls.adaptive_switch = None  # (<- not the base's adaptive switch)
     cls.get_default_case = staticmethod(get_default_case)
+    cls.dispatch_many = classmethod(_dispatch_many)
     return cls
 
+ANY = _Wildcard()  # wildcard for multi-key (tuple) case keys, e.g. (3, ANY)
+
 def case(*keys, **kwargs):
-    """Decorator: tags an attribute (probably a method) as a case object."""
+    """
+    Decorator: tags an attribute (probably a method) as a case object.
+
+    Apart from keys, range=(low, high) (or a sequence of such pairs)
+    can be given: interval keys -- any key x such that low <= x < high
+    (numbers, not only integers) is covered (only interval_switch_factory
+    supports them; it is used by default).  With batch=True the case
+    object is marked as accepting a list of items (see: dispatch_many).
+    """
     keys = list(keys)
     _default = kwargs.pop('default', False)
+    _range = kwargs.pop('range', None)
+    _batch = kwargs.pop('batch', False)
     _itsname = kwargs.pop('itsname', False)
     _classmethod = kwargs.pop('classmethod', False)
     _staticmethod = kwargs.pop('staticmethod', True)  # default option
@@ -74,7 +716,11 @@ def case(*keys, **kwargs):
             keys.append(_DEF_CASE_KEY)
         if _itsname:
             keys.append(obj.__name__)
+        if _range is not None:
+            keys.extend(_make_intervals(_range))
         obj._switch_case_keys = keys
+        if _batch:
+            obj._switch_case_batch = True
         if _classmethod:
             return classmethod(obj)
         elif _staticmethod:
@@ -99,6 +745,286 @@ def list_switch_factory(get_default_case, keys_to_cases, length=1000):
     return switch
 
 
+@staticmethod
+def byte_switch_factory(get_default_case, keys_to_cases):
+    """
+    A factory to create 256-entry byte/opcode switches.
+
+    Keys are byte values: integers 0..255 or 1-byte strings (b'A').  The
+    switch is a list (indexed by byte value, unassigned opcodes get the
+    default case or, if there is none, a case raising ValueError) that
+    also has the run(buffer, offset=0, end=None) method -- a tight
+    interpreter loop (see its docs): no slicing, no key conversion.
+    """
+    default_case = get_default_case()
+    if default_case is None:
+        def default_case(view, offset):
+            raise ValueError('unknown opcode %r at offset %d'
+                             % (view[offset], offset))
+    table = _ByteSwitch([default_case] * 256)
+    byte_keys_to_keys = {}
+    for key, case in keys_to_cases.items():
+        byte_key = _byte_key(key)
+        other_key = byte_keys_to_keys.setdefault(byte_key, key)
+        if other_key != key and table[byte_key] is not case:
+            raise ValueError('More than one case for key %r (byte %d)'
+                             % (key, byte_key))
+        table[byte_key] = case
+    return table
+
+@staticmethod
+def type_switch_factory(get_default_case, keys_to_cases):
+    """
+    A factory to create type-dispatch switches: switch[type(obj)].
+
+    Keys are types/classes; a lookup of a type that has not been seen yet
+    walks its MRO to the first declared type (then tries declared ABCs,
+    to support virtual subclasses; finally: the default case) and caches
+    the result, so a lookup of a type seen before is a single dict hit.
+    The switch's register(cls, case) method adds a case at runtime and
+    invalidates the cache (so does clear_cache(); if ABCs are declared,
+    their later register() calls are noticed automatically -- at the
+    cost of a token check per lookup).  switch.dispatch(obj) is a
+    shortcut for switch[type(obj)]; looking up a non-type raises
+    TypeError.
+    """
+    return _TypeSwitch(keys_to_cases, get_default_case())
+
+@staticmethod
+def compact_switch_factory(get_default_case, keys_to_cases, mindensity=0.05):
+    """
+    A factory to create compact integer-only-key switches.
+
+    The key span (min..max) is detected and -- if keys are dense enough,
+    i.e. len(keys) / span >= `mindensity` -- the switch is an array (with
+    the smallest sufficient typecode: 'B', 'H' or 'L') of indexes into a
+    tuple of distinct cases, starting at the minimum key (an offset); a
+    key outside the span gets the default case (no exceptions involved).
+    Otherwise a defaultdict is used.  Memory: 1 (or 2) bytes per key in
+    the span instead of list_switch_factory's pointer per key from 0.
+    """
+    non_int_keys = [key for key in keys_to_cases
+                    if not isinstance(key, _INT_TYPES)]
+    if non_int_keys:
+        raise ValueError(
+            'compact switch keys must be integers, not: ' +
+            ', '.join(map(repr, non_int_keys)))
+    default_case = get_default_case()
+    if not keys_to_cases:
+        return defaultdict(get_default_case, keys_to_cases)
+    offset = min(keys_to_cases)
+    length = max(keys_to_cases) - offset + 1
+    if len(keys_to_cases) < mindensity * length:
+        return defaultdict(get_default_case, keys_to_cases)
+    cases = [default_case]
+    case_ids_to_indexes = {id(default_case): 0}
+    key_indexes = []
+    for key, case in keys_to_cases.items():
+        index = case_ids_to_indexes.get(id(case))
+        if index is None:
+            index = case_ids_to_indexes[id(case)] = len(cases)
+            cases.append(case)
+        key_indexes.append((key - offset, index))
+    if len(cases) <= 0xFF:
+        typecode = 'B'
+    elif len(cases) <= 0xFFFF:
+        typecode = 'H'
+    else:
+        typecode = 'L'
+    indexes = array(typecode, [0]) * length
+    for position, index in key_indexes:
+        indexes[position] = index
+    return _CompactSwitch(offset, length, indexes, tuple(cases))
+
+@staticmethod
+def perfect_hash_switch_factory(get_default_case, keys_to_cases,
+                                maxtries=1000, maxsize=8):
+    """
+    A factory to create switches with a perfect hash of fixed key sets.
+
+    Designed for string keys (e.g. command names) known at class creation
+    time.  A hash-and-displace perfect hash is built (with the builtin
+    hash() -- cached for strings -- as the base): keys are spread into
+    buckets; for each bucket (the biggest first) an XOR mask is found
+    that maps its keys to free slots of the table (at most `maxtries`
+    masks are tried, otherwise the table is enlarged -- up to `maxsize`
+    slots per key).  A lookup is then one hash, two table indexings and
+    one equality check (a missing key gets the default case).  The
+    `lookup` attribute of the switch is the lookup function itself.  If
+    no perfect hash can be found (e.g. when distinct keys have equal
+    hashes, like -1 and -2) a defaultdict is returned.
+
+    Note that on CPython this switch is slower than the default dict
+    (about 2.7 times -- see test tour #5): the (C-level) dict lookup
+    beats any Python-level lookup function.
+    """
+    keys = list(keys_to_cases)
+    hashes = [hash(key) for key in keys]
+    if not keys or len(set(hashes)) < len(hashes):
+        return defaultdict(get_default_case, keys_to_cases)
+    size = len(keys)  # (minimal: as many slots as keys -- if possible)
+    while True:
+        found = _find_perfect_hash(hashes, size, maxtries)
+        if found is not None:
+            break
+        size += max(1, size // 8)
+        if size > maxsize * len(keys):
+            return defaultdict(get_default_case, keys_to_cases)
+    displacements, occupied = found
+    default_case = get_default_case()
+    table_keys = [_DEF_CASE_KEY] * size  # (<- never equal to a key)
+    table_cases = [default_case] * size
+    for slot, index in occupied.items():
+        table_keys[slot] = keys[index]
+        table_cases[slot] = keys_to_cases[keys[index]]
+    return _function_switch(
+        _make_perfect_hash_lookup(displacements, table_keys, table_cases,
+                                  default_case),
+        displacements=displacements, keys=table_keys, cases=table_cases)
+
+@staticmethod
+def generated_switch_factory(get_default_case, keys_to_cases,
+                             shape='auto', maxchain=8, leafsize=4):
+    """
+    A factory to create switches that are code-generated lookup functions.
+
+    The source code of a function (with the default case inlined) is
+    generated and compiled; the resultant switch calls the function on
+    `switch[key]` (its `lookup` attribute is the function itself; the
+    `shape` and `source` attributes are also available).  The `shape`:
+
+    * 'if' -- an if/elif sequence (one test per case);
+    * 'tree' -- a balanced binary tree of comparisons (for mutually
+      comparable keys, e.g. integers; leaves: if/elif of `leafsize` keys;
+      a key of another type is tested with an if/elif sequence);
+    * 'match' -- a match statement (Py3.10+; for keys being literals);
+    * 'auto' -- the applicable shapes ('if' and 'match' for at most
+      `maxchain` keys, 'tree' for integer keys) and a defaultdict (like
+      the one with_switch creates by default) are built and the one with
+      the fastest lookups of the declared keys is returned.  Note that
+      on CPython a (C-level) dict lookup usually beats a Python function
+      call anyway -- generated code pays off rather on JIT-compiling
+      implementations (such as PyPy).
+
+    (Another example of the optional `custom_switch_factory` attribute value).
+    """
+    if shape == 'auto':
+        keys = list(keys_to_cases)
+        candidates = [defaultdict(get_default_case, keys_to_cases)]
+        shapes = []
+        if len(keys) <= maxchain:
+            shapes.append('if')
+            if _MATCH_SUPPORTED and all(_literal_repr(key) is not None
+                                        for key in keys):
+                shapes.append('match')
+        if keys and all(type(key) in _INT_TYPES for key in keys):
+            shapes.append('tree')
+        for candidate_shape in shapes:
+            candidates.append(_generate_switch(
+                candidate_shape, get_default_case(), keys_to_cases, leafsize))
+        sample_keys = keys * max(1, 1000 // max(1, len(keys)))
+        timed = [(_lookup_time(switch, sample_keys), i, switch)
+                 for i, switch in enumerate(candidates)]
+        return min(timed)[2]
+    if shape not in ('if', 'tree', 'match'):
+        raise ValueError('unknown switch shape: %r' % (shape,))
+    if shape == 'match' and not _MATCH_SUPPORTED:
+        raise ValueError("the 'match' shape requires Python 3.10+")
+    return _generate_switch(shape, get_default_case(), keys_to_cases,
+                            leafsize)
+
+@staticmethod
+def tuple_switch_factory(get_default_case, keys_to_cases, denselimit=256):
+    """
+    A factory to create multi-key switches: keys are equal-length tuples.
+
+    Any key component can be the ANY wildcard, e.g. @case((3, ANY)).  The
+    keys are compiled into nested per-dimension tables: for a dimension
+    whose non-wildcard values are all integers from range(denselimit) --
+    lists (indexed by value; a value equal to such an integer, e.g. True,
+    matches it, as for a dict), for other ones -- dicts; both fall back to
+    the wildcard subtable, so a lookup is always a fixed number of
+    indexing steps (one per dimension; a tuple of the same length must
+    be looked up).  Precedence: if several keys match, the one with more
+    specific (non-wildcard) leading components wins, e.g. (3, ANY) wins
+    over (ANY, 1) for (3, 1).  The switch's `lookup` attribute is the
+    lookup function (its source is in the `source` attribute).
+    """
+    rules = list(keys_to_cases.items())
+    widths = set(len(key) for key, case in rules
+                 if isinstance(key, tuple))
+    if len(widths) != 1 or not all(isinstance(key, tuple)
+                                   for key, case in rules):
+        raise ValueError('tuple switch keys must be tuples of one length')
+    lengths = []
+    for dim in xrange(widths.pop()):
+        values = [key[dim] for key, case in rules if key[dim] is not ANY]
+        if values and all(type(value) in _INT_TYPES and
+                          0 <= value < denselimit for value in values):
+            lengths.append(max(values) + 1)
+        else:
+            lengths.append(None)  # (dict)
+    root = _build_tuple_table(rules, 0, lengths, get_default_case())
+    lookup, source = _make_tuple_lookup(root, lengths)
+    return _function_switch(lookup, root=root, source=source)
+
+@staticmethod
+def adaptive_switch_factory(get_default_case, keys_to_cases,
+                            warmup=10000, maxchain=16):
+    """
+    A factory to create self-tuning switches.
+
+    The switch starts as a (default-case-aware) dict that records the
+    keys being looked up; after `warmup` lookups (or when its adapt()
+    method is called) candidate backends are built: a defaultdict, an
+    offset list (compact_switch_factory -- if all declared and sampled
+    keys are integers), an if/elif chain with the most frequently sampled
+    keys tested first (if there are at most `maxchain` keys); each one is
+    timed on the sampled keys and the fastest one replaces cls.switch
+    (with_switch also sets cls.adaptive_switch to the adaptive switch,
+    whose `backend`, `reason` and `timings` attributes tell which one
+    has been chosen and why).  References to the adaptive switch taken
+    earlier still work (from then on, as a plain dict).
+    """
+    return _AdaptiveSwitch(get_default_case, keys_to_cases,
+                           warmup, maxchain)
+
+@staticmethod
+def interval_switch_factory(get_default_case, keys_to_cases):
+    """
+    A factory to create switches supporting interval keys: @case(range=...).
+
+    Exact keys are looked up first (in a dict); then -- only on a miss
+    -- the key is located with bisect in a sorted array of the interval
+    boundaries, so memory is O(number of intervals), not O(their width).
+    Intervals must not overlap.  (with_switch uses this factory if there
+    are interval keys and `custom_switch_factory` is not set).
+    """
+    default_case = get_default_case()
+    exact_keys_to_cases = {}
+    intervals = []
+    for key, case in keys_to_cases.items():
+        if isinstance(key, _Interval):
+            intervals.append((key.low, key.high, case))
+        else:
+            exact_keys_to_cases[key] = case
+    intervals.sort(key=(lambda interval: interval[:2]))
+    boundaries = []
+    region_cases = [default_case]  # region i: [boundaries[i-1], boundaries[i])
+    for low, high, case in intervals:
+        if boundaries and low < boundaries[-1]:
+            raise ValueError('interval [%r, %r) overlaps another one'
+                             % (low, high))
+        if boundaries and low == boundaries[-1]:
+            region_cases[-1] = case  # (adjacent to the previous interval)
+        else:
+            boundaries.append(low)
+            region_cases.append(case)
+        boundaries.append(high)
+        region_cases.append(default_case)
+    return _IntervalSwitch(exact_keys_to_cases, boundaries, region_cases)
+
+
 #
 # convenience classes (any of them can be used *optionally*
 # -- instead of using @with_switch directly)
@@ -225,7 +1151,7 @@ if __name__ == '__main__':
         def get_class(cls):
             return cls
 
-        @case(*xrange(30000, 40000))
+        @case(range=(30000, 40000))  # (interval: no 10000 dict items needed)
         def many_keys():
             return 'many_keys'
 
@@ -236,6 +1162,163 @@ if __name__ == '__main__':
         custom_switch_factory_kwargs = {'length': 10000}
 
 
+    # compact offset-based array of case indexes (here: forced even though
+    # the keys are sparse; by default a defaultdict would be chosen)
+    class CompactSwitch(DefaultDictSwitch):
+        custom_switch_factory = compact_switch_factory
+        custom_switch_factory_kwargs = {'mindensity': 0}
+
+
+    # code-generated lookup function (here: binary tree of int comparisons)
+    class GeneratedSwitch(DefaultDictSwitch):
+        custom_switch_factory = generated_switch_factory
+        custom_switch_factory_kwargs = {'shape': 'tree'}
+
+
+    # self-tuning: after the warm-up the fastest backend is chosen
+    # (re-created for each test tour -- see prepare_adaptive_switch())
+    def prepare_adaptive_switch():
+        global AdaptiveSwitch
+        class AdaptiveSwitch(DefaultDictSwitch):
+            custom_switch_factory = adaptive_switch_factory
+
+    def print_adaptive_switch_choice():
+        print('\nadaptive switch backend -- ' +
+              AdaptiveSwitch.adaptive_switch.reason)
+
+
+    # text-protocol command names (string keys)
+    class CommandSwitch(Switch):
+
+        @case('get', 'mget')
+        def get(arg):
+            return 'get' + arg
+
+        @case('set', 'mset', 'setex')
+        def set(arg):
+            return 'set' + arg
+
+        @case('del', 'unlink')
+        def delete(arg):
+            return 'del' + arg
+
+        @case('incr', 'incrby', 'decr', 'decrby')
+        def incr(arg):
+            return 'incr' + arg
+
+        @case('expire', 'ttl', 'persist')
+        def expire(arg):
+            return 'expire' + arg
+
+        @case('ping', 'echo', 'info', 'shutdown', 'get-class', 'subscribe',
+              'publish', 'select', 'flushdb', 'keys', 'scan', 'type')
+        def admin(arg):
+            return 'admin' + arg
+
+        @case(default=True)
+        def unknown(arg):
+            return 'unknown' + arg
+
+
+    # the same commands, perfect-hash-based
+    class PerfectHashCommandSwitch(CommandSwitch):
+        custom_switch_factory = perfect_hash_switch_factory
+
+
+    # binary protocol: opcodes (+ operands) decoded from a buffer
+    class OpcodeSwitch(Switch):
+        custom_switch_factory = byte_switch_factory
+
+        @case(0)
+        def nop(view, offset):
+            return 1
+
+        @case(1)
+        def push8(view, offset):
+            return 2
+
+        @case(2)
+        def push16(view, offset):
+            return 3
+
+        @case(3)
+        def push32(view, offset):
+            return 5
+
+    opcode_lengths = {0: 1, 1: 2, 2: 3, 3: 5}
+
+
+    # type dispatch (like functools.singledispatch): switch[type(obj)]
+    class TypeSwitch(Switch):
+        custom_switch_factory = type_switch_factory
+
+        @case(int)  # (bool as well -- found in its MRO, then cached)
+        def integer(arg):
+            return 'integer' + arg
+
+        @case(float, complex)
+        def number(arg):
+            return 'number' + arg
+
+        @case(str)
+        def text(arg):
+            return 'text' + arg
+
+        @case(list, tuple)
+        def sequence(arg):
+            return 'sequence' + arg
+
+        @case(dict)
+        def mapping(arg):
+            return 'mapping' + arg
+
+        @case(default=True)
+        def other(arg):
+            return 'other' + arg
+
+    type_samples = (1, True, 2.5, 'abc', [1], (1,), {}, None, object())
+
+
+    # multi-key dispatch: (message_type, version) pairs, with wildcards
+    class MessageSwitch(Switch):
+
+        @case((1, 1), (1, 2))
+        def hello_old(arg):
+            return 'hello_old' + arg
+
+        @case((1, ANY))
+        def hello(arg):
+            return 'hello' + arg
+
+        @case((2, ANY))
+        def data(arg):
+            return 'data' + arg
+
+        @case((3, 3), (4, 3))
+        def ack_v3(arg):
+            return 'ack_v3' + arg
+
+        @case((3, ANY), (4, ANY))
+        def ack(arg):
+            return 'ack' + arg
+
+        @case((ANY, 0))
+        def legacy(arg):
+            return 'legacy' + arg
+
+        @case(default=True)
+        def unknown(arg):
+            return 'unknown' + arg
+
+    # the same, as a plain dict of tuples + ad-hoc wildcard fallbacks
+    M = MessageSwitch
+    message_dict = {(1, 1): M.hello_old, (1, 2): M.hello_old,
+                    (3, 3): M.ack_v3, (4, 3): M.ack_v3,
+                    (1, None): M.hello, (2, None): M.data,
+                    (3, None): M.ack, (4, None): M.ack,
+                    (None, 0): M.legacy}
+
+
     # no real advantages over DefaultDictSwitch (added here only to show that)
     class DictBasedSwitch(DefaultDictSwitch):
         custom_switch_factory = staticmethod(
@@ -259,6 +1342,17 @@ if __name__ == '__main__':
         assert switch['get-class']() is AdminCommandSwitch
         assert switch[34567]() == 'many_keys'
 
+    def test_standard_dispatch_many():
+        "standard switch -- batch dispatch with dispatch_many()"
+        DefaultDictSwitch.dispatch_many(case_keys, [''] * len(case_keys))
+
+    def test_adaptive():
+        "adaptive switch (first run: with warm-up + adaptation)"
+        switch = AdaptiveSwitch.switch
+        x = ''
+        for key in case_keys:
+            x = switch[key](x[:10])
+
     def test_list_based_range_default():
         "list-based switch (default case support for keys from the range)"
         switch = ListBasedSwitch.switch
@@ -278,6 +1372,27 @@ if __name__ == '__main__':
             except _error:
                 x = default_case(x[:10])
 
+    def test_compact():
+        "compact offset-based switch (array of case indexes)"
+        switch = CompactSwitch.switch
+        x = ''
+        for key in case_keys:
+            x = switch[key](x[:10])
+
+    def test_generated():
+        "code-generated switch (default case inlined)"
+        switch = GeneratedSwitch.switch
+        x = ''
+        for key in case_keys:
+            x = switch[key](x[:10])
+
+    def test_generated_lookup():
+        "code-generated switch -- its lookup function called directly"
+        lookup = GeneratedSwitch.switch.lookup
+        x = ''
+        for key in case_keys:
+            x = lookup(key)(x[:10])
+
     def test_dict_based_no_default():
         "ordinary-dict-based switch, no default case support"
         switch = DictBasedSwitch.switch
@@ -305,6 +1420,135 @@ if __name__ == '__main__':
             except _error:
                 x = default_case(x[:10])
 
+    def test_command_standard():
+        "standard switch (command names)"
+        switch = CommandSwitch.switch
+        x = ''
+        for key in case_keys:
+            x = switch[key](x[:10])
+
+    def test_command_perfect_hash():
+        "perfect-hash-based switch (command names)"
+        switch = PerfectHashCommandSwitch.switch
+        x = ''
+        for key in case_keys:
+            x = switch[key](x[:10])
+
+    def test_command_perfect_hash_lookup():
+        "perfect-hash-based switch -- its lookup function called directly"
+        lookup = PerfectHashCommandSwitch.switch.lookup
+        x = ''
+        for key in case_keys:
+            x = lookup(key)(x[:10])
+
+    def test_command_if_elif():
+        "traditional if/elif.../else sequence (command names)"
+        x = ''
+        for key in case_keys:
+            if key == 'get' or key == 'mget':
+                x = 'get' + x[:10]
+            elif key in ('set', 'mset', 'setex'):
+                x = 'set' + x[:10]
+            elif key in ('del', 'unlink'):
+                x = 'del' + x[:10]
+            elif key in ('incr', 'incrby', 'decr', 'decrby'):
+                x = 'incr' + x[:10]
+            elif key in ('expire', 'ttl', 'persist'):
+                x = 'expire' + x[:10]
+            elif key in ('ping', 'echo', 'info', 'shutdown', 'get-class',
+                         'subscribe', 'publish', 'select', 'flushdb',
+                         'keys', 'scan', 'type'):
+                x = 'admin' + x[:10]
+            else:
+                x = 'unknown' + x[:10]
+
+    def prepare_opcode_buffer():
+        global opcode_buffer
+        instructions = []
+        for opcode in case_keys:
+            instructions.append(opcode)
+            instructions.extend([0] * (opcode_lengths[opcode] - 1))
+        opcode_buffer = bytes(bytearray(instructions))
+
+    def test_opcodes_run():
+        "byte switch -- its run() loop (no slicing/key conversion)"
+        OpcodeSwitch.switch.run(opcode_buffer)
+
+    def test_opcodes_sliced():
+        "byte switch -- Python loop with slicing + ord() for each opcode"
+        switch = OpcodeSwitch.switch
+        buffer = opcode_buffer
+        offset = 0
+        end = len(buffer)
+        while offset < end:
+            offset += switch[ord(buffer[offset:offset+1])](buffer, offset)
+
+    def prepare_type_objects():
+        global type_objects
+        type_objects = [type_samples[i] for i in case_keys]
+
+    def test_types_switch():
+        "type switch -- switch[type(obj)]"
+        switch = TypeSwitch.switch
+        x = ''
+        for obj in type_objects:
+            x = switch[type(obj)](x[:10])
+
+    def test_types_singledispatch():
+        "functools.singledispatch (Py3.4+)"
+        from functools import singledispatch
+        @singledispatch
+        def dispatch(obj, arg):
+            return 'other' + arg
+        dispatch.register(int, lambda obj, arg: 'integer' + arg)
+        dispatch.register(float, lambda obj, arg: 'number' + arg)
+        dispatch.register(complex, lambda obj, arg: 'number' + arg)
+        dispatch.register(str, lambda obj, arg: 'text' + arg)
+        dispatch.register(list, lambda obj, arg: 'sequence' + arg)
+        dispatch.register(tuple, lambda obj, arg: 'sequence' + arg)
+        dispatch.register(dict, lambda obj, arg: 'mapping' + arg)
+        x = ''
+        for obj in type_objects:
+            x = dispatch(obj, x[:10])
+
+    def test_types_isinstance():
+        "traditional if/elif.../else sequence of isinstance() checks"
+        x = ''
+        for obj in type_objects:
+            if isinstance(obj, int):
+                x = 'integer' + x[:10]
+            elif isinstance(obj, (float, complex)):
+                x = 'number' + x[:10]
+            elif isinstance(obj, str):
+                x = 'text' + x[:10]
+            elif isinstance(obj, (list, tuple)):
+                x = 'sequence' + x[:10]
+            elif isinstance(obj, dict):
+                x = 'mapping' + x[:10]
+            else:
+                x = 'other' + x[:10]
+
+    def test_tuple_switch():
+        "tuple switch -- nested per-dimension tables"
+        switch = MessageSwitch.switch
+        x = ''
+        for key in case_keys:
+            x = switch[key](x[:10])
+
+    def test_tuple_dict_fallbacks():
+        "dict of tuples, with ad-hoc fallbacks (try exact, then wildcards)"
+        get = message_dict.get
+        unknown = MessageSwitch.unknown
+        x = ''
+        for key in case_keys:
+            case_obj = get(key)
+            if case_obj is None:
+                message_type, version = key
+                case_obj = get((message_type, None))
+                if case_obj is None:
+                    case_obj = get((None, version), unknown)
+            x = case_obj(x[:10])
+
     def test_if_elif():
         "traditional if/elif.../else sequence"
         x = ''
@@ -352,15 +1596,55 @@ if __name__ == '__main__':
             else:
                 x = 'the default case' + x[:10]
 
-    def test_tour(test_seq, msg, case_keys_choice, case_keys_length=1000000):
+    class FullScanMixin(object):
+        "(a 2nd base class -- so that with_switch does the full scan)"
+
+    def create_class_hierarchy(depth, cases_per_class, keys_per_case,
+                               extra_bases=()):
+        cls = Switch
+        next_key = 0
+        for level in xrange(depth):
+            attr_dict = {}
+            for i in xrange(cases_per_class):
+                keys = xrange(next_key, next_key + keys_per_case)
+                next_key += keys_per_case
+                attr_dict['case_%d_%d' % (level, i)] = case(*keys)(
+                    lambda arg: arg)
+            cls = SwitchMeta('Level%d' % level, (cls,) + extra_bases,
+                             attr_dict)
+        return cls
+
+    def class_creation_tour(depth=100, cases_per_class=10,
+                            keys_per_case=10):
+        print('\nclass creation: a %d-level-deep hierarchy of Switch '
+              'subclasses, each adding %d cases with %d keys each:'
+              % (depth, cases_per_class, keys_per_case))
+        for extra_bases, description in (
+              ((FullScanMixin,), 'full scan (inspect.getmembers)'),
+              ((), "incremental (the parent's switch extended)")):
+            results = []
+            for i in xrange(3):
+                start = _clock()
+                create_class_hierarchy(depth, cases_per_class,
+                                       keys_per_case, extra_bases)
+                results.append(_clock() - start)
+            print('* %s: %s (fastest: %f)' % (
+                description, ', '.join('%f' % t for t in results),
+                min(results)))
+
+    def test_tour(test_seq, msg, case_keys_choice, case_keys_length=1000000,
+                  prepare=None):
         global case_keys
         case_keys_choice = sorted(case_keys_choice)
         print(
             '\ngenerating random-ordered, %d-item-long, '
             'sequence of keys from the set: {%s}...' %
-            (case_keys_length, ', '.join(map(repr, case_keys_choice))))
+            (case_keys_length,
+             ', '.join(map(repr, sorted(set(case_keys_choice))))))
         case_keys = [
             random.choice(case_keys_choice) for i in xrange(case_keys_length)]
+        if prepare is not None:
+            prepare()
         print('\n' + msg)
         fastest_tests = []
         for test in test_seq:
@@ -388,8 +1672,13 @@ if __name__ == '__main__':
         test_if_elif,
         test_standard,
         test_standard2,
+        test_standard_dispatch_many,
+        test_adaptive,
         test_list_based_range_default,
         test_list_based_with_try_except,
+        test_compact,
+        test_generated,
+        test_generated_lookup,
         test_dict_based_no_default,
         test_dict_based_with_get,
         test_dict_based_with_try_except,
@@ -398,7 +1687,9 @@ if __name__ == '__main__':
     test_tour(
         test_seq,
         'test tour #1 (default cases not used; small number of keys):',
-        case_keys_choice = tuple(xrange(1, 10)))
+        case_keys_choice = tuple(xrange(1, 10)),
+        prepare=prepare_adaptive_switch)
+    print_adaptive_switch_choice()
 
     test_tour(
         test_seq,
@@ -407,7 +1698,9 @@ if __name__ == '__main__':
             71, 77, 18, 81, 88, 111, 118, 181, 188, 811, 818, 881, 888,
             91, 99, 119, 191, 199, 911, 919, 991, 999,
             1111, 1119, 1191, 1199, 1911, 1919, 1991, 1999,
-            9111, 9119, 9191, 9199, 9911, 9919, 9991, 9999)))
+            9111, 9119, 9191, 9199, 9911, 9919, 9991, 9999)),
+        prepare=prepare_adaptive_switch)
+    print_adaptive_switch_choice()
 
     test_tour(
         test_seq,
@@ -417,7 +1710,9 @@ if __name__ == '__main__':
             71, 77, 18, 81, 88, 111, 118, 181, 188, 811, 818, 881, 888,
             91, 99, 119, 191, 199, 911, 919, 991, 999,
             1111, 1119, 1191, 1199, 1911, 1919, 1991, 1999,
-            9111, 9119, 9191, 9199, 9911, 9919, 9991, 9999)))
+            9111, 9119, 9191, 9199, 9911, 9919, 9991, 9999)),
+        prepare=prepare_adaptive_switch)
+    print_adaptive_switch_choice()
 
     test_tour(
         test_seq,
@@ -429,4 +1724,53 @@ if __name__ == '__main__':
             91, 99, 119, 191, 199, 911, 919, 991, 999,
             1111, 1119, 1191, 1199, 1911, 1919, 1991, 1999,
             9111, 9119, 9191, 9199, 9911, 9919, 9991, 9999) +
-            tuple(xrange(10000, 10050))))
+            tuple(xrange(10000, 10050))),
+        prepare=prepare_adaptive_switch)
+    print_adaptive_switch_choice()
+
+    test_tour(
+        (
+            test_command_if_elif,
+            test_command_standard,
+            test_command_perfect_hash,
+            test_command_perfect_hash_lookup,
+        ),
+        'test tour #5 (string keys: command names; realistic distribution):',
+        # most requests are reads and writes, some are admin commands
+        # or unknown commands (default case)
+        case_keys_choice=(
+            ('get',) * 50 + ('mget',) * 5 + ('set',) * 20 + ('setex',) * 5 +
+            ('del',) * 5 + ('incr',) * 5 + ('expire', 'ttl') * 2 +
+            ('ping', 'info', 'shutdown', 'get-class', 'select', 'scan') +
+            ('bogus', 'GET')))
+
+    test_tour(
+        (
+            test_opcodes_sliced,
+            test_opcodes_run,
+        ),
+        'test tour #6 (byte opcodes: decoding a buffer of instructions):',
+        case_keys_choice=(0, 1, 2, 3),
+        prepare=prepare_opcode_buffer)
+
+    test_tour(
+        (
+            test_types_isinstance,
+            test_types_singledispatch,
+            test_types_switch,
+        ),
+        'test tour #7 (type dispatch; keys: indexes of sample objects):',
+        case_keys_choice=tuple(xrange(len(type_samples))),
+        prepare=prepare_type_objects)
+
+    test_tour(
+        (
+            test_tuple_dict_fallbacks,
+            test_tuple_switch,
+        ),
+        'test tour #8 (multi-key: (message_type, version), with wildcards):',
+        case_keys_choice=[(message_type, version)
+                          for message_type in xrange(6)
+                          for version in xrange(5)])
+
+    class_creation_tour()
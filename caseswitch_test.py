@@ -0,0 +1,372 @@
+#!/usr/bin/env python
+# Copyright (c) 2011 Jan Kaliszewski (zuo). All rights reserved.
+# Licensed under the MIT License. Python 2.6+/3.x-compatibile.
+
+import abc
+import sys
+import unittest
+from collections import defaultdict
+
+from caseswitch import *
+from caseswitch import _DEF_CASE_KEY, _scan_cases
+
+
+#
+# helper function
+
+def make_switch_class(factory=None, factory_kwargs=None, base=Switch,
+                      **cases):
+    # cases: name -> keys (a list of keys or a dict of case() kwargs);
+    # each case returns its name
+    attr_dict = {}
+    if factory is not None:
+        attr_dict['custom_switch_factory'] = factory
+    if factory_kwargs is not None:
+        attr_dict['custom_switch_factory_kwargs'] = factory_kwargs
+    for name, keys in cases.items():
+        if isinstance(keys, dict):
+            decorator = case(**keys)
+        else:
+            decorator = case(*keys)
+        attr_dict[name] = decorator(
+            (lambda name: lambda *args: name)(name))
+    return SwitchMeta('TestSwitch', (base,), attr_dict)
+
+
+#
+# actual tests
+
+class TestGeneratedTree(unittest.TestCase):
+
+    def setUp(self):
+        self.switch = make_switch_class(
+            generated_switch_factory, {'shape': 'tree', 'leafsize': 2},
+            low=list(range(10)), high=list(range(10, 20)),
+            other={'default': True}).switch
+
+    def test_int_keys(self):
+        self.assertEqual(self.switch[3](), 'low')
+        self.assertEqual(self.switch[15](), 'high')
+        self.assertEqual(self.switch[25](), 'other')
+
+    def test_keys_of_other_types(self):
+        self.assertEqual(self.switch['x'](), 'other')
+        self.assertEqual(self.switch[None](), 'other')
+        self.assertEqual(self.switch[12.0](), 'high')  # (as for a dict)
+        self.assertEqual(self.switch[True](), 'low')
+
+
+class TestGeneratedShapes(unittest.TestCase):
+
+    def test_keys_of_mixed_types(self):
+        shapes = ['if', 'auto']  # (not 'tree': for comparable keys)
+        if sys.version_info >= (3, 10):
+            shapes.append('match')
+        for shape in shapes:
+            switch = make_switch_class(
+                generated_switch_factory, {'shape': shape},
+                one=[1, 'one'], two=[2, None],
+                other={'default': True}).switch
+            for key, name in [(1, 'one'), ('one', 'one'), (2, 'two'),
+                              (None, 'two'), (3, 'other'), ('x', 'other')]:
+                self.assertEqual(switch[key](), name)
+            if shape != 'auto':
+                self.assertEqual(switch.shape, shape)
+                self.assertTrue(switch.source.startswith('def lookup('))
+
+    def test_unknown_shape(self):
+        self.assertRaises(ValueError, make_switch_class,
+                          generated_switch_factory, {'shape': 'bogus'},
+                          one=[1])
+
+
+class TestIntervals(unittest.TestCase):
+
+    def setUp(self):
+        class IntervalSwitch(Switch):
+            @case(15)
+            def fifteen(): return 'fifteen'
+            @case(range=(0, 10))
+            def low(): return 'low'
+            @case(range=[(10, 20), (30, 40)])
+            def middle(): return 'middle'
+            @case(range=(40, 50.5))
+            def high(): return 'high'
+            @case(default=True)
+            def other(): return 'other'
+        self.switch = IntervalSwitch.switch
+
+    def test_adjacent_intervals(self):
+        for key, name in [(-1, 'other'), (0, 'low'), (9.99, 'low'),
+                          (10, 'middle'), (19.5, 'middle'), (20, 'other'),
+                          (30, 'middle'), (40, 'high'), (50, 'high'),
+                          (50.5, 'other'), (10 ** 30, 'other')]:
+            self.assertEqual(self.switch[key](), name)
+
+    def test_exact_key_wins(self):
+        self.assertEqual(self.switch[15](), 'fifteen')
+        self.assertEqual(self.switch[16](), 'middle')
+
+    def test_non_comparable_keys(self):
+        for key in ('x', None, (1,), 1j):
+            self.assertEqual(self.switch[key](), 'other')
+
+    def test_invalid_intervals(self):
+        self.assertRaises(ValueError, make_switch_class,
+                          a={'range': (0, 10)}, b={'range': (5, 15)})
+        self.assertRaises(ValueError, lambda: case(range=(5, 5))(len))
+
+    def test_other_factories(self):
+        for factory in (list_switch_factory, generated_switch_factory):
+            self.assertRaises(ValueError, make_switch_class, factory,
+                              a={'range': (0, 10)})
+
+
+class TestCompact(unittest.TestCase):
+
+    def test_keys_of_other_types(self):
+        switch = make_switch_class(compact_switch_factory,
+                                   one_two=[1, 2],
+                                   other={'default': True}).switch
+        self.assertEqual(switch[2](), 'one_two')
+        self.assertEqual(switch[2.0](), 'one_two')
+        self.assertEqual(switch[True](), 'one_two')
+        for key in (2.5, '2', None, float('inf'), -7, 10 ** 30):
+            self.assertEqual(switch[key](), 'other')
+
+    def test_non_int_keys(self):
+        self.assertRaises(ValueError, make_switch_class,
+                          compact_switch_factory, one=[1], text=['x'])
+
+    def test_sparse_keys(self):
+        switch = make_switch_class(compact_switch_factory,
+                                   low=[0], high=[10 ** 6],
+                                   other={'default': True}).switch
+        self.assertTrue(isinstance(switch, defaultdict))
+        self.assertEqual(switch[10 ** 6](), 'high')
+        self.assertEqual(switch[5](), 'other')
+
+
+class TestDispatchMany(unittest.TestCase):
+
+    def setUp(self):
+        batches = self.batches = []
+        class Operations(Switch):
+            @case(1)
+            def double(x): return 2 * x
+            @case(2, batch=True)
+            def negate_all(xs):
+                batches.append(list(xs))
+                return [-x for x in xs]
+            @case(default=True)
+            def same(x): return x
+        self.cls = Operations
+
+    def test_order_and_batching(self):
+        self.assertEqual(
+            self.cls.dispatch_many([1, 2, 3, 2, 1], [10, 20, 30, 40, 50]),
+            [20, -20, 30, -40, 100])
+        self.assertEqual(self.batches, [[20, 40]])  # (<- one call)
+        self.assertEqual(self.cls.dispatch_many([], []), [])
+
+    def test_invalid_lengths(self):
+        self.assertRaises(ValueError, self.cls.dispatch_many,
+                          [1, 2], [10])
+        class Bad(Switch):
+            @case(1, batch=True)
+            def drop_all(xs): return []
+        self.assertRaises(ValueError, Bad.dispatch_many, [1, 1], [10, 20])
+
+    def test_numpy_arrays(self):
+        try:
+            import numpy
+        except ImportError:
+            return
+        keys = numpy.array([1, 2, 3, 2, 1])
+        for items in (numpy.array([10, 20, 30, 40, 50]),
+                      [10, 20, 30, 40, 50]):
+            del self.batches[:]
+            self.assertEqual(self.cls.dispatch_many(keys, items),
+                             [20, -20, 30, -40, 100])
+            self.assertEqual(self.batches, [[20, 40]])
+
+
+class TestPerfectHash(unittest.TestCase):
+
+    def test_keys_with_equal_hashes(self):
+        # (on CPython hash(-1) == hash(-2); no perfect hash can be found,
+        # so a defaultdict is used -- instead of looping forever)
+        cls = make_switch_class(perfect_hash_switch_factory,
+                                minus_one=[-1], minus_two=[-2],
+                                other={'default': True})
+        switch = cls.switch
+        self.assertEqual(switch[-1](), 'minus_one')
+        self.assertEqual(switch[-2](), 'minus_two')
+        self.assertEqual(switch[3](), 'other')
+
+    def test_command_names(self):
+        cls = make_switch_class(perfect_hash_switch_factory,
+                                get=['get', 'mget'], set=['set'],
+                                other={'default': True})
+        switch = cls.switch
+        self.assertEqual(switch['mget'](), 'get')
+        self.assertEqual(switch['set'](), 'set')
+        self.assertEqual(switch['bogus'](), 'other')
+
+
+class TestByteSwitch(unittest.TestCase):
+
+    def test_same_byte_different_cases(self):
+        self.assertRaises(ValueError, make_switch_class,
+                          byte_switch_factory, int_a=[65], char_a=['A'])
+
+    def test_same_byte_same_case(self):
+        switch = make_switch_class(byte_switch_factory,
+                                   a=[65, 'A']).switch
+        self.assertEqual(switch[65](), 'a')
+
+    def test_keys_beyond_byte_range(self):
+        for key in (256, -1, u'\u0100', 'AB'):
+            self.assertRaises(ValueError, make_switch_class,
+                              byte_switch_factory, a=[key])
+
+    def test_run(self):
+        class OpcodeSwitch(Switch):
+            custom_switch_factory = byte_switch_factory
+            @case(1)
+            def push8(view, offset):
+                return 2
+            @case(0)
+            def halt(view, offset):
+                return 0
+        buffer = bytes(bytearray([1, 7, 1, 9, 0, 1, 1]))
+        self.assertEqual(OpcodeSwitch.switch.run(buffer), 4)
+        self.assertRaises(ValueError, OpcodeSwitch.switch.run,
+                          bytes(bytearray([1, 7, 2])))
+
+
+class TestTypeSwitch(unittest.TestCase):
+
+    def test_mro_and_register(self):
+        class Base(object): pass
+        class Derived(Base): pass
+        switch = make_switch_class(type_switch_factory,
+                                   base_class=[Base], integer=[int],
+                                   other={'default': True}).switch
+        self.assertEqual(switch[Derived](), 'base_class')
+        self.assertEqual(switch[bool](), 'integer')
+        self.assertEqual(switch[str](), 'other')
+        self.assertTrue(Derived in switch)  # (cached)
+        switch.register(Derived, lambda: 'derived')
+        self.assertEqual(switch[Derived](), 'derived')
+
+    def test_non_type_lookup_and_dispatch(self):
+        switch = make_switch_class(type_switch_factory, integer=[int],
+                                   other={'default': True}).switch
+        self.assertRaises(TypeError, switch.__getitem__, 5)
+        self.assertEqual(switch.dispatch(5)(), 'integer')
+        self.assertEqual(switch.dispatch('x')(), 'other')
+
+    def test_abc_registered_later(self):
+        Shape = abc.ABCMeta('Shape', (object,), {})
+        class Square(object): pass
+        switch = make_switch_class(type_switch_factory, shape=[Shape],
+                                   other={'default': True}).switch
+        self.assertEqual(switch[Square](), 'other')
+        Shape.register(Square)
+        self.assertEqual(switch[Square](), 'shape')
+
+
+class TestTupleSwitch(unittest.TestCase):
+
+    def test_wildcards_and_precedence(self):
+        switch = make_switch_class(
+            exact=[(3, 1)], three_any=[(3, ANY)], any_one=[(ANY, 1)],
+            other={'default': True}).switch
+        self.assertEqual(switch[(3, 1)](), 'exact')
+        self.assertEqual(switch[(3, 7)](), 'three_any')
+        self.assertEqual(switch[(4, 1)](), 'any_one')
+        self.assertEqual(switch[(4, 2)](), 'other')
+        self.assertEqual(switch[('x', None)](), 'other')
+
+    def test_components_equal_to_ints(self):
+        # (list-backed dimensions match like dicts do: True == 1)
+        switch = make_switch_class(
+            one_any=[(1, ANY)], zero_two=[(0, 2)], text=[('x', ANY)],
+            other={'default': True}).switch
+        self.assertEqual(switch[(True, 'y')](), 'one_any')
+        self.assertEqual(switch[(1.0, 'y')](), 'one_any')
+        self.assertEqual(switch[(False, 2.0)](), 'zero_two')
+        self.assertEqual(switch[(1.5, 'y')](), 'other')
+        self.assertEqual(switch[('x', 'y')](), 'text')
+
+    def test_duplicate_tuple_key(self):
+        try:
+            make_switch_class(a=[(1, 2)], b=[(1, 2)])
+        except ValueError as exc:
+            self.assertEqual(str(exc), 'More than one case for key (1, 2)')
+        else:
+            self.fail('ValueError not raised')
+
+
+class TestAdaptiveSwitch(unittest.TestCase):
+
+    def test_adaptation(self):
+        cls = make_switch_class(adaptive_switch_factory, {'warmup': 100},
+                                one=[1], two=[2], other={'default': True})
+        adaptive = cls.switch
+        for i in range(100):
+            self.assertEqual(adaptive[i % 3 + 1](),
+                             ['one', 'two', 'other'][i % 3])
+        self.assertTrue(cls.switch is not adaptive)
+        adapted = cls.adaptive_switch
+        self.assertTrue(adapted.reason.startswith(adapted.backend + ':'))
+        self.assertEqual(cls.switch[2](), 'two')
+        self.assertEqual(adaptive[2](), 'two')  # (an old reference)
+        self.assertEqual(cls.switch['x'](), 'other')
+
+    def test_subclass_with_other_factory(self):
+        base = make_switch_class(adaptive_switch_factory, {'warmup': 10},
+                                 one=[1])
+        self.assertTrue(base.adaptive_switch is base.switch)
+        derived = make_switch_class(compact_switch_factory, {}, base=base,
+                                    two=[2])
+        self.assertTrue(derived.adaptive_switch is None)
+        self.assertEqual(derived.switch[1](), 'one')
+        self.assertTrue(base.adaptive_switch is base.switch)
+
+
+class TestIncrementalSubclasses(unittest.TestCase):
+
+    def assertSameAsFullScan(self, cls):
+        expected = _scan_cases(cls)[1]
+        expected.pop(_DEF_CASE_KEY, None)
+        self.assertEqual(dict(cls.switch), expected)
+
+    def test_overriding_and_classmethods(self):
+        class A(Switch):
+            @case(1, 2)
+            def one(): return 'one'
+            @case('cls', classmethod=True)
+            def get_class(cls): return cls
+        class B(A):
+            one = None
+            @case(3)
+            def three(): return 'three'
+        class C(B):
+            @case(1)
+            def again(): return 'again'
+        for cls in (A, B, C):
+            self.assertSameAsFullScan(cls)
+            self.assertTrue(cls.switch['cls']() is cls)
+        self.assertFalse(1 in B.switch)
+        self.assertEqual(C.switch[1](), 'again')
+
+    def test_duplicate_key_in_subclass(self):
+        base = make_switch_class(one=[1])
+        self.assertRaises(ValueError, make_switch_class, base=base,
+                          another_one=[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,30 +1,103 @@
 #!/usr/bin/env python
 # Copyright (c) 2010-2011 Jan Kaliszewski (zuo). All rights reserved.
-# Licensed under the MIT License. Python 2.6/2.7-compatibile.
+# Licensed under the MIT License. Python 2.6/2.7/3.x-compatibile.
 
+import ast
+import dis
+import functools
+import inspect
+import json
+import os
 import os.path
+import random
+import struct
 import sys
+import threading
+import time
+import warnings
+from collections import deque
+from heapq import merge as _heapq_merge
 from contextlib import contextmanager
-from repr import repr as default_reprfunc
+from operator import itemgetter
+try:
+    from repr import repr as default_reprfunc
+except ImportError:
+    from reprlib import repr as default_reprfunc  # Py3.x
 
-__all__ = 'trace_logging_on',
+try: basestring
+except NameError:
+    basestring = str  # Py3.x
+
+try:
+    from thread import get_ident as _get_thread_ident
+except ImportError:
+    from _thread import get_ident as _get_thread_ident  # Py3.x
+
+__all__ = ('trace_logging_on', 'trace_logging_armed', 'trace_functions',
+           'BoundedRepr',
+           'bounded_repr', 'FlightRecorder', 'CallStats', 'ChromeTraceWriter',
+           'FoldedStacks', 'BinaryTraceWriter', 'merge_traces', 'LineCoverage',
+           'merge_coverage')
 
 default_refdir = os.path.dirname(sys.modules['__main__'].__file__)
 
+default_events2log = {  # mapping events to .format()-able log patterns
+    'call': '[C  ] {path}: {name}{callargs}',
+    'return': '[  R] {path}: {name}  ->  {argrepr}',
+    'exception': '[ E ] {path}, in {name}:\n{traceback}',
+    # (asyncio_tasks mode: coroutine events and task summaries)
+    'start': '[C  ] {path}: {name}{callargs}',
+    'resume': '[~> ] {path}: {name}',
+    'suspend': '[ <~] {path}: {name}  (awaiting {argrepr})',
+    'finish': '[  R] {path}: {name}  ->  {argrepr}',
+    'taskdone': ('[ T ] {path}: {name}  task done: {runtime:.6f}s running '
+                 '({steps} steps, longest {maxstep:.6f}s), '
+                 '{awaittime:.6f}s awaiting'),
+}  # [.format()-able patterns refer to tracer()'s locals]
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+# clock comparable between processes (Py3.3+; wall clock on older Pythons)
+_monotonic = getattr(time, 'monotonic', time.time)
+
+# can local line events be switched off per frame? (Py3.7+)
+_frame_has_trace_lines = hasattr(sys._getframe(), 'f_trace_lines')
+
+_CO_COROUTINE = getattr(inspect, 'CO_COROUTINE', 0)  # (Py3.5+)
+# opcodes at which a coroutine's frame is left when it is suspended
+# (Py<3.11: f_lasti of a frame suspended in YIELD_FROM is moved back to
+# the preceding instruction -- so that YIELD_FROM is re-executed later;
+# then f_lasti at YIELD_FROM itself means an exception is propagating)
+_YIELD_FROM = dis.opmap.get('YIELD_FROM')
+_SUSPENDING_OPCODES = frozenset(dis.opmap[opname] for opname in (
+    ('YIELD_VALUE', 'YIELD_FROM', 'RESUME') if sys.version_info >= (3, 11)
+    else ('YIELD_VALUE',)) if opname in dis.opmap)
+
 
 def trace_logging_on(refdir=default_refdir,    # reference-point directory path
                      negprefix=('..', '<'),  # negative filtering path prefixes
                      filterfunc=(lambda s: True),   # custom filtering function
                      filterarg='',     # .format()-able filter argument pattern
                                        # e.g. '{event}&{path}&{frame.f_lineno}'
-                     events2log = { # mapping events to .format()-able log patt
-                         'call': '[C  ] {path}: {name}{callargs}',
-                         'return': '[  R] {path}: {name}  ->  {argrepr}',
-                         'exception': '[ E ] {path}, in {name}:\n{traceback}',
-                     },  # [.format()-able patterns refer to tracer()'s locals]
+                     events2log=default_events2log,  # (see the definition)
                      logger='',                       # logger name or instance
                      loggermethod='debug',                 # logger method name
-                     reprfunc=default_reprfunc):  # repr()-replacement function
+                     reprfunc=default_reprfunc,   # repr()-replacement function
+                                  # (e.g. bounded_repr or other BoundedRepr)
+                     sink=None,       # event sink (used instead of logger)
+                     sampleevery=1,  # trace only every N-th call of a func
+                     samplerate=1.0,     # fraction of top-level calls to trace
+                     maxrate=None,     # max number of traced events per second
+                     min_duration=None,  # log only calls slower than that [s]
+                     slowcall2log=('[ S ] {path}: {name}  took {duration:.6f}s'
+                                   '{childtimes}'),  # slow call summary patt
+                     childtimes=False,   # summarize slow calls' child timings?
+                     all_threads=False,     # trace also other (new) threads?
+                     flushinterval=0.1,  # background log flushing interval
+                     async_emit=False,   # format & log in a background thread?
+                     queuesize=10000,   # async_emit queue size (per thread)
+                     overflow='block',  # or 'drop' or 'dropoldest' (on full)
+                     asyncio_tasks=False):  # tag events with asyncio tasks?
 
     """
     Enable logging of Python call/return/exception events (handily filtered).
@@ -33,29 +106,176 @@ def trace_logging_on(refdir=default_refdir,    # reference-point directory path
     * simply-turn-on call:        trace_logging_on(...)
     * context manager syntax:     with trace_logging_on(...): ...
     * context manager with 'as':  with trace_logging_on(...) as tracefunc: ...
+
+    If `sink` is given (e.g. a FlightRecorder, CallStats, ChromeTraceWriter
+    or FoldedStacks instance) events are not formatted and logged one by
+    one but passed -- if not filtered out -- to sink(frame, event, arg,
+    path); then the events are selected with the `sink.events` collection
+    (instead of `events2log` keys) and the `filterarg` pattern can refer
+    only to {frame}, {event}, {arg}, {path} and {name}.  If the sink has
+    a close() method it is called at the end of the `with` block.  If the
+    sink returns False, the frame's further (local) events are not traced.
+    If the sink has a true `lines_once` attribute (e.g. LineCoverage) and,
+    on Py3.12+, the sys.monitoring coverage tool id is free, the sink gets
+    only line events -- through sys.monitoring, each line (code location)
+    once, then the location is disabled; then the tracer is not installed
+    at all and the sink gets events of all threads (sampling not applied).
+
+    Sampling: a call can be sampled out because it is not the N-th call
+    of its function (`sampleevery`), because it is a top-level one (no
+    traced caller) and a random draw says so (`samplerate`) or because
+    `maxrate` has been reached in the current 1-second window -- then the
+    call's whole subtree is skipped: the tracer returns None for any call
+    event until the sampled-out call returns.  The number of calls dropped
+    due to `maxrate` is kept as the `dropped` attribute of the tracer
+    function (the one that can be bound with `with ... as tracefunc`).
+
+    If `min_duration` is given (and `sink` is not) call and return events
+    are paired and a call is logged -- after it returns, with its call,
+    exception and return lines followed by the `slowcall2log` line -- only
+    if it lasted at least `min_duration` seconds; the patterns can refer
+    also to {duration} and {childtimes} (the latter being empty unless
+    `childtimes` is true; then it lists the durations of traced direct
+    subcalls, summed per function).  Call arguments are snapshotted (not
+    formatted) at call time, so they are repr'ed only for slow calls.
+
+    If `all_threads` is true the tracer is also installed for threads
+    started later (threading.settrace()) and -- on Py3.12+ -- for all
+    already running threads (threading.settrace_all_threads()).  Then
+    (unless `sink` is given) log messages are prefixed with the thread
+    name, kept in per-thread buffers and logged by a background thread
+    (in time-ordered batches, every `flushinterval` seconds).
+
+    If `async_emit` is true (then neither `sink` nor `min_duration` can
+    be given) the traced threads only capture raw event data (code objects,
+    argument/return value reprs obtained with `reprfunc`, exception info)
+    into bounded per-thread queues of `queuesize` items; the background
+    thread (see above) does the filtering, formatting and logging.  Then
+    the patterns (and `filterarg`) can refer only to {event}, {path},
+    {name}, {argrepr}, {callargs} and {traceback}.  When a queue is full
+    the `overflow` policy decides: 'block' (wait for the background
+    thread), 'drop' (the new event) or 'dropoldest'; the number of dropped
+    events is logged at the end.
+
+    If `asyncio_tasks` is true (Py3.7+; then none of `sink`,
+    `min_duration` and `async_emit` can be given) log messages of events
+    within an asyncio task are prefixed with the task name, and events of
+    coroutines are distinguished: 'start', 'resume' (instead of 'call'),
+    'suspend' and 'finish' (instead of 'return') -- their patterns are
+    taken from `events2log` (if it lacks them, from the 'call'/'return'
+    ones).  Per task, the time spent running (in steps: from resuming
+    the task's outermost traced coroutine to its suspension) and the time
+    spent awaiting are measured; when the task's own coroutine finishes
+    the 'taskdone' pattern is logged (it can refer also to {runtime},
+    {awaittime}, {steps} and {maxstep} -- the longest step; a long step
+    means the coroutine has blocked the event loop).
     """
 
+    if async_emit and (sink is not None or min_duration is not None):
+        raise ValueError('async_emit cannot be combined with sink '
+                         'or min_duration')
+    if asyncio_tasks and (sink is not None or min_duration is not None
+                          or async_emit):
+        raise ValueError('asyncio_tasks cannot be combined with sink, '
+                         'min_duration or async_emit')
     from inspect import getargvalues, formatargvalues
     from traceback import format_exception
-    if isinstance(logger, basestring):
-        from logging import getLogger
-        logger = getLogger(logger)
-    log = getattr(logger, loggermethod)
+    log = _get_log(logger, loggermethod)
     relpath = os.path.relpath
     formatvalue = (lambda s: '=' + reprfunc(s))
     filterarg_format = filterarg.format
+    handled_events = frozenset(events2log if sink is None else sink.events)
+    lines_off = _frame_has_trace_lines and 'line' not in handled_events
+    filename_to_path = {}  # (path or None if out of scope; cached per file)
+    sampling = (sampleevery > 1 or samplerate < 1.0 or maxrate is not None)
+    sampling_state = _SamplingState()
+    call_counts = {}        # code object -> number of its (in-scope) calls
+    rate_window = [0.0, 0]  # [current 1-second window end, events within it]
 
     def tracer(frame, event, arg):
-        if event not in events2log:  # initial event filtering
+        if not tracer.active:  # (<- e.g. in a thread started within the
+            if sys.gettrace() is tracer:  # `with` block, after its end)
+                sys.settrace(None)
+            return None
+        if sampling:
+            if event == 'call':
+                if sampling_state.skipped is not None:
+                    return None  # (<- within a sampled-out call's subtree)
+            elif event == 'return' and frame is sampling_state.top:
+                sampling_state.top = None
+        if event not in handled_events:  # initial event filtering
             return tracer
-        path = relpath(frame.f_code.co_filename, refdir)  # relative to refdir
+        try:
+            path = filename_to_path[frame.f_code.co_filename]
+        except KeyError:
+            path = scope_path(frame.f_code.co_filename)
+        if path is None:
+            return None  # (<- None to discontinue tracing in sub-scopes)
+        if event == 'call':
+            if sampling and sampled_out(frame):
+                sampling_state.skipped = frame
+                if _frame_has_trace_lines:
+                    frame.f_trace_lines = False
+                return skipped_call_tracer
+            if lines_off:
+                frame.f_trace_lines = False  # (<- no useless line events)
+        elif maxrate is not None:
+            within_maxrate()  # (<- only counting; we let it by anyway)
+        if handle(frame, event, arg, path) is False:
+            return None  # (<- the sink does not need more of this frame)
+        return tracer
+
+    def scope_path(filename):
+        path = relpath(filename, refdir)  # relative to refdir
         # path-prefix-based scope filtering (negative, i.e. False lets by)
         if path.startswith(negprefix):
-            return None  # (<- None to discontinue tracing in sub-scopes)
+            path = None
+        filename_to_path[filename] = path
+        return path
+
+    def monitor_line(code, line_number):  # (sys.monitoring LINE callback)
+        try:
+            path = filename_to_path[code.co_filename]
+        except KeyError:
+            path = scope_path(code.co_filename)
+        if path is not None:
+            handle(sys._getframe(1), 'line', None, path)
+        return sys.monitoring.DISABLE  # (<- this line is done with)
+
+    def sampled_out(frame):
+        if sampleevery > 1:
+            code = frame.f_code
+            count = call_counts[code] = call_counts.get(code, 0) + 1
+            if (count - 1) % sampleevery:
+                return True
+        if samplerate < 1.0 and sampling_state.top is None:
+            if random.random() >= samplerate:
+                return True
+            sampling_state.top = frame
+        if maxrate is not None and not within_maxrate():
+            tracer.dropped += 1
+            return True
+        return False
+
+    def within_maxrate():
+        now = _clock()
+        if now >= rate_window[0]:
+            rate_window[:] = [now + 1.0, 0]
+        if rate_window[1] >= maxrate:
+            return False
+        rate_window[1] += 1
+        return True
+
+    def skipped_call_tracer(frame, event, arg):
+        if event == 'return':
+            sampling_state.skipped = None
+        return skipped_call_tracer
+
+    def log_event(frame, event, arg, path, task=None):
         # adding some locals (to be used to format filtering/logging arguments)
         name = frame.f_code.co_name
         argrepr = reprfunc(arg)
-        if event == 'call':
+        if event in ('call', 'start'):
             argvalues = (getargvalues(frame) if name != '<genexpr>'
                          else ([],) + getargvalues(frame)[1:])
             callargs = formatargvalues(*argvalues, formatvalue=formatvalue)
@@ -63,21 +283,1869 @@ def trace_logging_on(refdir=default_refdir,    # reference-point directory path
             traceback = ''.join(format_exception(*arg))
         pattern_fields = locals()
         # callback-based individual filtering (positive, i.e. True lets by)
-        if not filterfunc(filterarg_format(**pattern_fields)):
-            return tracer
-        # event-specific logging
-        log(events2log[event].format(**pattern_fields))
-        return tracer
+        if filterfunc(filterarg_format(**pattern_fields)):
+            # event-specific logging
+            try:
+                pattern = events2log[event]
+            except KeyError:  # (coroutine events: falling back)
+                pattern = events2log['call' if event in ('start', 'resume')
+                                     else 'return']
+            message = pattern.format(**pattern_fields)
+            log(message if task is None else '[{0}] {1}'.format(task,
+                                                                 message))
+
+    def log_task_event(frame, event, arg, path):
+        loop = get_running_loop()
+        task = current_task(loop) if loop is not None else None
+        if task is None:
+            log_event(frame, event, arg, path)
+            return
+        try:
+            timing = task_timings[task]
+        except KeyError:
+            timing = task_timings[task] = _TaskTiming(task)
+        if frame.f_code.co_flags & _CO_COROUTINE:
+            if event == 'exception':
+                if issubclass(arg[0], StopIteration):
+                    return  # (<- just an awaited future's result)
+            else:
+                now = _clock()
+                if event == 'call':
+                    event = ('start' if _coroutine_starting(frame)
+                             else 'resume')
+                    timing.step_began(now)
+                else:
+                    event = ('suspend' if _coroutine_suspending(frame)
+                             else 'finish')
+                    timing.step_ended(now)
+        log_event(frame, event, arg, path, timing.name)
+        if (event == 'finish' and frame is timing.frame
+              and 'taskdone' in events2log):
+            del task_timings[task]
+            log_fields(events2log['taskdone'], frame=frame, event='taskdone',
+                       arg=None, path=path, name=frame.f_code.co_name,
+                       task=timing.name, runtime=timing.runtime,
+                       awaittime=timing.awaittime, steps=timing.steps,
+                       maxstep=timing.maxstep, prefix=timing.name)
+
+    def log_slow_event(frame, event, arg, path):
+        now = _clock()
+        try:
+            pending = slow_state.pending
+        except AttributeError:
+            # [frame, path, start, argvalues, exc_args, code -> childtime]
+            pending = slow_state.pending = []
+        if event == 'call':
+            args, varargs, keywords, f_locals = getargvalues(frame)
+            if frame.f_code.co_name == '<genexpr>':
+                args = []
+            pending.append([frame, path, now,
+                            (args, varargs, keywords, dict(f_locals)), [], {}])
+        elif event == 'exception':
+            if pending and pending[-1][0] is frame:
+                pending[-1][4].append(arg)
+        elif any(entry[0] is frame for entry in pending):  # 'return'
+            entry = pending.pop()
+            while entry[0] is not frame:  # (skipping calls whose returns
+                entry = pending.pop()     # have not been seen)
+            _, _, start, argvalues, exc_args, code_to_childtime = entry
+            duration = now - start
+            if pending:
+                childtime = pending[-1][5].setdefault(frame.f_code,
+                                                      [path, 0, 0.0])
+                childtime[1] += 1
+                childtime[2] += duration
+            if duration >= min_duration:
+                log_slow_call(frame, path, argvalues, exc_args, arg,
+                              duration, code_to_childtime)
+
+    def log_slow_call(frame, path, argvalues, exc_args, retvalue,
+                      duration, code_to_childtime):
+        name = frame.f_code.co_name
+        if childtimes:
+            childtimes_repr = ''.join(
+                '\n    {0}: {1}  x{2}  {3:.6f}s'.format(
+                    childpath, code.co_name, count, childduration)
+                for code, (childpath, count, childduration) in sorted(
+                    code_to_childtime.items(),
+                    key=(lambda item: item[1][2]), reverse=True))
+        else:
+            childtimes_repr = ''
+        common = dict(frame=frame, path=path, name=name,
+                      duration=duration, childtimes=childtimes_repr)
+        log_fields(events2log['call'], event='call', arg=None,
+                   argrepr=reprfunc(None), argvalues=argvalues,
+                   callargs=formatargvalues(*argvalues,
+                                            formatvalue=formatvalue),
+                   **common)
+        for exc_arg in exc_args:
+            log_fields(events2log['exception'], event='exception',
+                       arg=exc_arg, argrepr=reprfunc(exc_arg),
+                       traceback=''.join(format_exception(*exc_arg)),
+                       **common)
+        for event, pattern in (('return', events2log['return']),
+                               ('slowcall', slowcall2log)):
+            log_fields(pattern, event=event, arg=retvalue,
+                       argrepr=reprfunc(retvalue), **common)
+
+    def log_fields(pattern, prefix=None, **pattern_fields):
+        if filterfunc(filterarg_format(**pattern_fields)):
+            message = pattern.format(**pattern_fields)
+            log(message if prefix is None else '[{0}] {1}'.format(prefix,
+                                                                  message))
+
+    def capture_event(frame, event, arg, path):
+        # (only raw data here; formatting is done by render_captured_event())
+        if event == 'call':
+            args, varargs, keywords, f_locals = getargvalues(frame)
+            if frame.f_code.co_name == '<genexpr>':
+                args = []
+            argnames = list(args)
+            for argname in argnames:  # (Py2.x: nested args are lists)
+                if isinstance(argname, list):
+                    argnames.extend(argname)
+            argnames.extend(argname for argname in (varargs, keywords)
+                            if argname is not None)
+            snapshot = (args, varargs, keywords,
+                        dict((argname, reprfunc(f_locals[argname]))
+                             for argname in argnames
+                             if not isinstance(argname, list)))
+        else:
+            snapshot = None
+        log((event, path, frame.f_code, reprfunc(arg), snapshot,
+             arg if event == 'exception' else None))
+
+    def render_captured_event(captured):
+        event, path, code, argrepr, snapshot, exc_arg = captured
+        pattern_fields = dict(event=event, path=path, name=code.co_name,
+                              argrepr=argrepr)
+        if event == 'call':
+            pattern_fields['callargs'] = formatargvalues(
+                *snapshot, **dict(formatvalue=(lambda r: '=' + r)))
+        elif event == 'exception':
+            pattern_fields['traceback'] = ''.join(format_exception(*exc_arg))
+        if filterfunc(filterarg_format(**pattern_fields)):
+            return events2log[event].format(**pattern_fields)
+        return None
 
-    with_support = [_with_statement_support(tracer, previous=sys.gettrace())]
+    def pass_to_sink(frame, event, arg, path):
+        name = frame.f_code.co_name
+        if filterfunc(filterarg_format(frame=frame, event=event, arg=arg,
+                                       path=path, name=name)):
+            return sink(frame, event, arg, path)
+        return None
+
+    to_close = []
+    if sink is not None:
+        to_close.append(sink)
+    elif all_threads or async_emit:
+        if async_emit:
+            emitter = _BackgroundEmitter(log, flushinterval,
+                                         render=render_captured_event,
+                                         maxsize=queuesize, overflow=overflow)
+        else:
+            emitter = _BackgroundEmitter(log, flushinterval)
+        to_close.append(emitter)
+        log = emitter.emit  # (<- log messages or captured data go there)
+    if sink is not None:
+        handle = pass_to_sink
+    elif min_duration is not None:
+        slow_state = threading.local()
+        handle = log_slow_event
+    elif async_emit:
+        handle = capture_event
+    elif asyncio_tasks:
+        from asyncio import current_task, _get_running_loop as get_running_loop
+        from weakref import WeakKeyDictionary
+        task_timings = WeakKeyDictionary()  # task -> _TaskTiming instance
+        handle = log_task_event
+    else:
+        handle = log_event
+    tracer.dropped = 0
+    tracer.active = True  # (cleared at the end of the `with` block)
+    if (sink is not None and getattr(sink, 'lines_once', False)
+          and _LineMonitor.available()):
+        line_monitor = _LineMonitor(monitor_line)
+        to_close.insert(0, line_monitor)  # (<- stopped before closing sink)
+        with_support = [_with_statement_support(
+            tracer, previous=sys.gettrace(), to_close=to_close)]
+        line_monitor.start()
+        return with_support.pop()
+    with_support = [_with_statement_support(
+        tracer, previous=sys.gettrace(),
+        threads_previous=(_get_threading_trace() if all_threads
+                          else _NOT_TOUCHED),
+        to_close=to_close)]
     sys.settrace(tracer)
+    if all_threads:
+        _settrace_threads(tracer, tracer)
     return with_support.pop()   # (we don't like circular references...)
 
 
+def trace_functions(*funcs_or_qualnames, **kwargs):
+
+    """
+    Enable logging of call/return/exception events of the given functions.
+
+    Only the specified functions are instrumented (replaced with logging
+    wrappers where they live: in their modules or classes) -- no global
+    tracer is installed, so the rest of the program runs at full speed.
+
+    Functions can be specified as objects or as qualified names, e.g.
+    'package.module.function', 'package.module:Class.method'.  Keyword
+    arguments: `refdir`, `filterfunc`, `filterarg`, `events2log`, `logger`,
+    `loggermethod`, `reprfunc` -- as for trace_logging_on() (here the
+    patterns can refer to {event}, {path}, {name}, {arg}, {argrepr},
+    {callargs} and {traceback}).
+
+    Usage variants (the original functions are restored at the end of the
+    `with` block):
+    * simply-turn-on call:        trace_functions(...)
+    * context manager syntax:     with trace_functions(...): ...
+    * context manager with 'as':  with trace_functions(...) as wrappers: ...
+    """
+
+    refdir = kwargs.pop('refdir', default_refdir)
+    filterfunc = kwargs.pop('filterfunc', (lambda s: True))
+    filterarg = kwargs.pop('filterarg', '')
+    events2log = kwargs.pop('events2log', default_events2log)
+    logger = kwargs.pop('logger', '')
+    loggermethod = kwargs.pop('loggermethod', 'debug')
+    reprfunc = kwargs.pop('reprfunc', default_reprfunc)
+    if kwargs:
+        raise TypeError(
+            'trace_functions() got unexpected keyword arguments: %s' %
+            ', '.join(sorted(kwargs)))
+
+    from traceback import format_exception
+    log = _get_log(logger, loggermethod)
+    formatvalue = (lambda s: '=' + reprfunc(s))
+    filterarg_format = filterarg.format
+
+    def log_event(**pattern_fields):
+        # callback-based individual filtering (positive, i.e. True lets by)
+        if (pattern_fields['event'] in events2log and
+              filterfunc(filterarg_format(**pattern_fields))):
+            log(events2log[pattern_fields['event']].format(**pattern_fields))
+
+    def make_wrapper(func):
+        code = func.__code__
+        path = os.path.relpath(code.co_filename, refdir)
+        name = code.co_name
+        format_callargs = _get_callargs_formatter(func, formatvalue)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            log_event(event='call', path=path, name=name, arg=None,
+                      argrepr=reprfunc(None),
+                      callargs=format_callargs(args, kwargs))
+            try:
+                result = func(*args, **kwargs)
+            except:
+                exc_info = sys.exc_info()
+                log_event(event='exception', path=path, name=name,
+                          arg=exc_info, argrepr=reprfunc(exc_info),
+                          traceback=''.join(format_exception(
+                              exc_info[0], exc_info[1],
+                              exc_info[2].tb_next)))  # (<- no wrapper)
+                log_event(event='return', path=path, name=name,
+                          arg=None, argrepr=reprfunc(None))
+                raise
+            log_event(event='return', path=path, name=name,
+                      arg=result, argrepr=reprfunc(result))
+            return result
+
+        return wrapper
+
+    patches = []  # (owner, attribute name, original raw attribute,
+                  #  whether it was owner's own -- not inherited -- one)
+    wrappers = []
+    try:
+        for func_or_qualname in funcs_or_qualnames:
+            owner, attrname = _find_owner(func_or_qualname)
+            raw, is_own = _get_raw_attribute(owner, attrname)
+            if isinstance(raw, (staticmethod, classmethod)):
+                func = raw.__get__(None, owner)
+                func = getattr(func, '__func__', func)  # (classmethod)
+            else:
+                func = raw
+            if not hasattr(func, '__code__'):
+                raise TypeError('{0!r} is not a Python function'
+                                .format(func_or_qualname))
+            wrapper = make_wrapper(func)
+            patches.append((owner, attrname, raw, is_own))
+            if isinstance(raw, (staticmethod, classmethod)):
+                setattr(owner, attrname, type(raw)(wrapper))
+            else:
+                setattr(owner, attrname, wrapper)
+            wrappers.append(wrapper)
+    except:
+        _unpatch(patches)
+        raise
+    return _restoring_support(wrappers, patches)
+
+
+def trace_logging_armed(signum=None,        # signal toggling tracing (if any)
+                        controlfile=None,   # control file path (if any)
+                        pollinterval=1.0,   # control file checking interval
+                        sinkfactory=None,   # to create a new sink on enabling
+                        **kwargs):          # trace_logging_on() arguments
+    """
+    Arm trace_logging_on() -- to be enabled/disabled at runtime.
+
+    Until tracing is enabled nothing is installed, so there is no overhead.
+    The returned object has enable(**overrides) (the `overrides` replace
+    some of the arguments, also later), disable(), toggle() and close()
+    (disable + disarm) methods and the `enabled` attribute; it can also
+    be used as a context manager (closed at the end of the `with` block).
+
+    Tracing is toggled with the `signum` signal (e.g. signal.SIGUSR2; the
+    handler is installed, so the function must be called in the main
+    thread) and/or controlled with the `controlfile`: a background thread
+    checks it every `pollinterval` seconds and, when it changes, applies
+    it (a missing file means 'off'), e.g.:
+
+        on
+        # the optional following lines override the arguments
+        # (values are Python literals):
+        samplerate = 0.01
+        negprefix = ('..', '<', 'lib')
+
+    When tracing is enabled the tracer is installed in the current thread
+    and as the trace function of all live frames (`frame.f_trace`) -- and,
+    by default (`all_threads=True`), also in threads started later and
+    (on Py3.12+) in all running threads.  The interpreter ignores
+    `frame.f_trace` in threads without a trace function, so on older
+    Pythons other running threads are not traced, and tracing should be
+    disabled in the thread that enabled it; for that reason, if `signum`
+    is given, changes of the control file are applied by sending the
+    signal (i.e. in the main thread).
+
+    A sink is closed when tracing is disabled (e.g. CallStats dumps its
+    statistics then) -- pass `sinkfactory` to get a new one each time.
+    """
+
+    kwargs.setdefault('all_threads', True)
+    return _ArmedTraceLogging(signum, controlfile, pollinterval,
+                              sinkfactory, kwargs)
+
+
+class BoundedRepr(object):
+
+    """
+    A size-bounded, type-dispatched repr() replacement (for `reprfunc`).
+
+    Containers are shown up to `maxdepth` levels and `maxitems` items per
+    level, strings -- up to `maxstring` characters, other objects' reprs
+    are truncated to `maxother` characters and the whole result -- to
+    `maxtotal`; if formatting one value takes longer than `timebudget`
+    seconds the rest of it is elided.  NumPy-like arrays are summarized
+    as shape + dtype (their repr() is never called).  Reprs of big (at
+    least `cacheminlen` items/characters) objects that are immutable
+    through and through (strings, tuples, frozensets of such...) are
+    cached, keyed by identity, so repeatedly traced ones cost nothing.
+
+    Formatters for other types can be added with register(type, func)
+    (func(obj) -> string; the result is truncated to `maxother`).
+    """
+
+    _immutable_atomic_types = frozenset([
+        str, bytes, type(u''), int, type(2 ** 64), float, complex, bool,
+        type(None)])
+
+    def __init__(self, maxdepth=3, maxitems=8, maxstring=60, maxother=60,
+                 maxtotal=400, timebudget=0.001, cacheminlen=100,
+                 cachesize=1000, otherrepr=repr):
+        self.maxdepth = maxdepth
+        self.maxitems = maxitems
+        self.maxstring = maxstring
+        self.maxother = maxother
+        self.maxtotal = maxtotal
+        self.timebudget = timebudget
+        self.cacheminlen = cacheminlen
+        self.cachesize = cachesize
+        self.otherrepr = otherrepr
+        self._cache = {}  # id(obj) -> (obj, its repr)
+        self._type_to_formatter = {}  # (registered)
+        self._dispatch_cache = {}     # (resolved, for any concrete type)
+        for types, formatter in [
+                ((str, bytes, type(u'')), self._repr_string),
+                ((list, deque), self._repr_list),
+                ((tuple,), self._repr_tuple),
+                ((set, frozenset), self._repr_set),
+                ((dict,), self._repr_dict)]:
+            for cls in types:
+                self._type_to_formatter[cls] = formatter
+        for cls in self._immutable_atomic_types:
+            self._type_to_formatter.setdefault(cls, self._repr_other)
+
+    def register(self, cls, func):
+        """Register func(obj) -> string as the formatter for cls objects."""
+        self._type_to_formatter[cls] = (
+            lambda obj, level, state: self._truncate(func(obj),
+                                                     self.maxother))
+        self._dispatch_cache.clear()
+
+    def __call__(self, obj):
+        cache = self._cache
+        cacheable = (type(obj) in self._cacheable_types and
+                     len(obj) >= self.cacheminlen)
+        if cacheable:
+            cached = cache.get(id(obj))
+            if cached is not None and cached[0] is obj:
+                return cached[1]
+        state = [(_clock() + self.timebudget if self.timebudget else None),
+                 True]  # [deadline, whether all immutable so far]
+        result = self._truncate(self.repr1(obj, self.maxdepth, state),
+                                self.maxtotal)
+        if cacheable and state[1]:
+            if len(cache) >= self.cachesize:
+                cache.clear()
+            cache[id(obj)] = obj, result
+        return result
+
+    _cacheable_types = frozenset([str, bytes, type(u''), tuple, frozenset])
+
+    def repr1(self, obj, level, state):
+        cls = type(obj)
+        try:
+            formatter = self._dispatch_cache[cls]
+        except KeyError:
+            for base in getattr(cls, '__mro__', (cls,)):
+                formatter = self._type_to_formatter.get(base)
+                if formatter is not None:
+                    break
+            else:
+                formatter = self._repr_other
+            self._dispatch_cache[cls] = formatter
+        return formatter(obj, level, state)
+
+    def _repr_string(self, obj, level, state):
+        if len(obj) <= self.maxstring:
+            return repr(obj)
+        s = repr(obj[:self.maxstring])
+        return s[:-1] + '...' + s[-1]
+
+    def _repr_list(self, obj, level, state):
+        state[1] = False
+        return self._repr_items(obj, level, state, '[', ']')
+
+    def _repr_tuple(self, obj, level, state):
+        if len(obj) == 1:
+            return self._repr_items(obj, level, state, '(', ',)')
+        return self._repr_items(obj, level, state, '(', ')')
+
+    def _repr_set(self, obj, level, state):
+        if type(obj) is not frozenset:
+            state[1] = False
+        if not obj:
+            return '{0}()'.format(type(obj).__name__)
+        return self._repr_items(obj, level, state,
+                                '{0}(['.format(type(obj).__name__), '])')
+
+    def _repr_items(self, obj, level, state, left, right):
+        if not obj:
+            return left + right
+        if level <= 0:
+            return left + '...' + right
+        reprs = []
+        deadline = state[0]
+        repr1 = self.repr1
+        for i, item in enumerate(obj):
+            if i >= self.maxitems or (deadline and _clock() > deadline):
+                reprs.append('...')
+                break
+            reprs.append(repr1(item, level - 1, state))
+        return left + ', '.join(reprs) + right
+
+    def _repr_dict(self, obj, level, state):
+        state[1] = False
+        if not obj:
+            return '{}'
+        if level <= 0:
+            return '{...}'
+        reprs = []
+        deadline = state[0]
+        repr1 = self.repr1
+        for i, (key, value) in enumerate(obj.items()):
+            if i >= self.maxitems or (deadline and _clock() > deadline):
+                reprs.append('...')
+                break
+            reprs.append(repr1(key, level - 1, state) + ': ' +
+                         repr1(value, level - 1, state))
+        return '{' + ', '.join(reprs) + '}'
+
+    def _repr_other(self, obj, level, state):
+        if type(obj) not in self._immutable_atomic_types:
+            state[1] = False
+            shape = getattr(obj, 'shape', None)
+            dtype = getattr(obj, 'dtype', None)
+            if shape is not None and dtype is not None:  # (NumPy-like)
+                return '<{0} shape={1!r} dtype={2}>'.format(
+                    type(obj).__name__, shape, dtype)
+        try:
+            s = self.otherrepr(obj)
+        except Exception:  # (e.g. Py3.11+ refuses to repr() huge ints)
+            s = '<{0} object (unrepresentable)>'.format(type(obj).__name__)
+        return self._truncate(s, self.maxother)
+
+    @staticmethod
+    def _truncate(s, maxlen):
+        if len(s) <= maxlen:
+            return s
+        i = max(0, (maxlen - 3) // 2)
+        j = max(0, maxlen - 3 - i)
+        return s[:i] + '...' + (s[len(s) - j:] if j else '')
+
+bounded_repr = BoundedRepr()
+
+
+class FlightRecorder(object):
+
+    """
+    Event sink: records compact event tuples in per-thread ring buffers.
+
+    Nothing is formatted until dump() is called -- explicitly, or by a
+    trigger: an uncaught exception (if `excepthook` is true) or a signal
+    (if `signum` is given); then the last `dumpsize` recorded events
+    (from all threads, in time order) are formatted and logged.
+
+    close() uninstalls the triggers, restoring the previous hooks and
+    signal handler (trace_logging_on() calls it at the end of the `with`
+    block; if the block is left with an exception, the events are dumped
+    then).  The recorded events can still be dumped explicitly.
+    """
+
+    events = 'call', 'return', 'exception'
+
+    def __init__(self, size=1000,        # ring buffer size (per thread)
+                 dumpsize=100,           # default number of events to dump
+                 summaryfunc=None,  # cheap (frame, event, arg)->summary func
+                 events2log = {  # mapping events to .format()-able log patt
+                     'call': '[C  ] {time:+.6f}s {thread}: {path}: {name}',
+                     'return': ('[  R] {time:+.6f}s {thread}: {path}: {name}'
+                                '  ->  {summary}'),
+                     'exception': ('[ E ] {time:+.6f}s {thread}: {path}, in '
+                                   '{name} (line {lineno}): {summary}'),
+                 },  # [{time} is relative to the last dumped event]
+                 logger='',                   # logger name or instance
+                 loggermethod='debug',             # logger method name
+                 excepthook=True,      # dump on uncaught exceptions?
+                 signum=None):         # signal number to dump on (if any)
+        self.size = size
+        self.dumpsize = dumpsize
+        self.summaryfunc = summaryfunc
+        self.events2log = events2log
+        self.log = _get_log(logger, loggermethod)
+        self._buffers = {}       # thread ident -> deque of event tuples
+        self._thread_names = {}  # thread ident -> thread name
+        self.excepthook = excepthook
+        self._uninstallers = []  # (functions uninstalling the triggers)
+        if excepthook:
+            self._install_excepthooks()
+        if signum is not None:
+            self._install_signal_handler(signum)
+
+    def __call__(self, frame, event, arg, path):
+        ident = _get_thread_ident()
+        try:
+            buf = self._buffers[ident]
+        except KeyError:
+            self._thread_names[ident] = threading.current_thread().name
+            buf = self._buffers[ident] = deque(maxlen=self.size)
+        summaryfunc = self.summaryfunc
+        buf.append((_clock(), ident, event, path, frame.f_code,
+                    frame.f_lineno,
+                    '' if summaryfunc is None
+                    else summaryfunc(frame, event, arg)))
+
+    def dump(self, n=None):
+        """Format and log the last `n` (default: `dumpsize`) events."""
+        if n is None:
+            n = self.dumpsize
+        records = []
+        for buf in list(self._buffers.values()):
+            records.extend(list(buf))
+        records.sort(key=itemgetter(0))
+        records = records[-n:] if n else []
+        self.log('FlightRecorder: the last {0} recorded events'
+                 .format(len(records)))
+        if records:
+            last_time = records[-1][0]
+        for timestamp, ident, event, path, code, lineno, summary in records:
+            self.log(self.events2log[event].format(
+                time=(timestamp - last_time),
+                thread=self._thread_names.get(ident, ident),
+                event=event, path=path, name=code.co_name,
+                lineno=lineno, summary=summary))
+
+    def close(self):
+        """Uninstall the triggers (restoring the previous ones)."""
+        if self._uninstallers:
+            if self.excepthook and sys.exc_info()[0] is not None:
+                self.dump()  # (<- leaving a `with` block with an exception)
+            while self._uninstallers:
+                self._uninstallers.pop()()
+
+    def _trigger(self):
+        # -> function dumping events while the triggers are installed
+        # (it refers to the recorder weakly; that matters if a hook could
+        # not be restored, because someone replaced it in the meantime)
+        from weakref import ref
+        recorder_ref = ref(self)
+        def dump():
+            recorder = recorder_ref()
+            if recorder is not None and recorder._uninstallers:
+                recorder.dump()
+        return dump
+
+    def _install_excepthooks(self):
+        dump = self._trigger()
+        previous_excepthook = sys.excepthook
+        def excepthook(*exc_info):
+            dump()
+            previous_excepthook(*exc_info)
+        sys.excepthook = excepthook
+        self._uninstallers.append(functools.partial(
+            _restore_hook, sys, 'excepthook', excepthook, previous_excepthook))
+        previous_threading_excepthook = getattr(threading, 'excepthook', None)
+        if previous_threading_excepthook is not None:  # (Py3.8+)
+            def threading_excepthook(hook_args):
+                dump()
+                previous_threading_excepthook(hook_args)
+            threading.excepthook = threading_excepthook
+            self._uninstallers.append(functools.partial(
+                _restore_hook, threading, 'excepthook',
+                threading_excepthook, previous_threading_excepthook))
+
+    def _install_signal_handler(self, signum):
+        import signal
+        dump = self._trigger()
+        previous_handler = signal.signal(signum,
+                                         (lambda signum, frame: dump()))
+        if previous_handler is None:  # (<- not installed from Python)
+            previous_handler = signal.SIG_DFL
+        self._uninstallers.append(functools.partial(
+            signal.signal, signum, previous_handler))
+
+
+def _restore_hook(namespace, name, hook, previous_hook):
+    if getattr(namespace, name) is hook:  # (<- not replaced by others)
+        setattr(namespace, name, previous_hook)
+
+
+class CallStats(object):
+
+    """
+    Event sink: maintains per-function call statistics (a filtered profiler).
+
+    For each code object: number of calls, total (cumulative) and self wall
+    time, number of exception events and maximum (traced) call depth.  The
+    summary table is logged on demand (dump()) or when the sink is closed
+    (at the end of the `with` block or, if `atexit` is true, at exit).
+    """
+
+    events = 'call', 'return', 'exception'
+
+    columns = 'calls', 'total', 'self', 'exceptions', 'maxdepth'
+
+    def __init__(self, sortby='self',    # column to sort the summary by
+                 limit=None,             # max number of rows in the summary
+                 logger='',                   # logger name or instance
+                 loggermethod='debug',             # logger method name
+                 atexit=True):           # dump the summary at exit?
+        if sortby not in self.columns:
+            raise ValueError('sortby must be one of: ' +
+                             ', '.join(self.columns))
+        self.sortby = sortby
+        self.limit = limit
+        self.log = _get_log(logger, loggermethod)
+        self._local = threading.local()
+        self._thread_stats = []  # per-thread dicts: code -> stats list
+        self._closed = False
+        if atexit:
+            import atexit
+            atexit.register(self.close)
+
+    def __call__(self, frame, event, arg, path):
+        now = _clock()
+        local = self._local
+        try:
+            stack = local.stack
+        except AttributeError:
+            stack = local.stack = []  # [frame, code, start, children time]
+            local.active = {}         # code -> number of its frames on stack
+            local.stats = {}
+            self._thread_stats.append(local.stats)
+        code = frame.f_code
+        if event == 'call':
+            depth = len(stack) + 1
+            try:
+                stats = local.stats[code]
+            except KeyError:
+                # [calls, total, self, exceptions, maxdepth, path]
+                stats = local.stats[code] = [0, 0.0, 0.0, 0, 0, path]
+            stats[0] += 1
+            if depth > stats[4]:
+                stats[4] = depth
+            local.active[code] = local.active.get(code, 0) + 1
+            stack.append([frame, code, now, 0.0])
+        elif event == 'exception':
+            try:
+                local.stats[code][3] += 1
+            except KeyError:
+                pass  # (frame entered before tracing was switched on)
+        else:  # 'return'
+            while stack:  # (frames whose returns were not seen are skipped)
+                if stack[-1][0] is frame:
+                    self._pop(local, now)
+                    break
+                if not any(entry[0] is frame for entry in stack):
+                    break
+                self._pop(local, now)
+
+    @staticmethod
+    def _pop(local, now):
+        _, code, start, children_time = local.stack.pop()
+        elapsed = now - start
+        stats = local.stats[code]
+        stats[2] += elapsed - children_time
+        local.active[code] -= 1
+        if not local.active[code]:  # (recursive calls are not summed twice)
+            stats[1] += elapsed
+        if local.stack:
+            local.stack[-1][3] += elapsed
+
+    def rows(self):
+        """Get sorted (path, lineno, name, calls, total, self, ...) rows."""
+        merged = {}
+        for thread_stats in list(self._thread_stats):
+            for code, stats in list(thread_stats.items()):
+                row = merged.get(code)
+                if row is None:
+                    merged[code] = list(stats)
+                else:
+                    for i in range(4):
+                        row[i] += stats[i]
+                    row[4] = max(row[4], stats[4])
+        sortindex = self.columns.index(self.sortby)
+        rows = sorted(
+            ((path, code.co_firstlineno, code.co_name,
+              calls, total, self_, exceptions, maxdepth)
+             for code, (calls, total, self_, exceptions, maxdepth, path)
+             in merged.items()),
+            key=itemgetter(3 + sortindex), reverse=True)
+        return rows[:self.limit]
+
+    def dump(self):
+        """Log the summary table."""
+        lines = ['CallStats summary (sorted by {0}):'.format(self.sortby),
+                 '{0:>9} {1:>12} {2:>12} {3:>10} {4:>8}  {5}'.format(
+                     'calls', 'total [s]', 'self [s]', 'exceptions',
+                     'maxdepth', 'path:lineno(function)')]
+        for (path, lineno, name,
+             calls, total, self_, exceptions, maxdepth) in self.rows():
+            lines.append(
+                '{0:>9} {1:>12.6f} {2:>12.6f} {3:>10} {4:>8}  '
+                '{5}:{6}({7})'.format(calls, total, self_, exceptions,
+                                      maxdepth, path, lineno, name))
+        self.log('\n'.join(lines))
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.dump()
+
+
+class ChromeTraceWriter(object):
+
+    """
+    Event sink: streams Chrome trace-event JSON (for Perfetto/about:tracing).
+
+    Calls and returns become B/E duration events (with pid, tid and
+    microsecond timestamps), exceptions -- instant events.  Events are
+    buffered and written in batches of `buffersize`; the JSON array is
+    completed when the sink is closed (at the end of the `with` block or,
+    if `atexit` is true, at exit).
+    """
+
+    events = 'call', 'return', 'exception'
+
+    def __init__(self, file,             # file path or writable file object
+                 buffersize=1000,        # number of events written at a time
+                 atexit=True):           # close the sink at exit?
+        if isinstance(file, basestring):
+            self._file = open(file, 'w')
+            self._own_file = True
+        else:
+            self._file = file
+            self._own_file = False
+        self.buffersize = buffersize
+        self._pid = os.getpid()
+        self._local = threading.local()
+        self._buffer = deque()
+        self._code_to_fields = {}  # code -> '"name":...,"cat":...' (cached)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._separator = ''
+        self._file.write('[\n')
+        if atexit:
+            import atexit
+            atexit.register(self.close)
+
+    def __call__(self, frame, event, arg, path):
+        ts = _clock() * 1e6
+        local = self._local
+        try:
+            stack = local.stack
+        except AttributeError:
+            stack = local.stack = []  # frames with 'B' events (not 'E' yet)
+            local.head = '"pid":{0},"tid":{1}'.format(self._pid,
+                                                      _get_thread_ident())
+            self._buffer.append(
+                '{{"name":"thread_name","ph":"M",{0},"args":{{"name":{1}}}}}'
+                .format(local.head,
+                        json.dumps(threading.current_thread().name)))
+        if event == 'call':
+            code = frame.f_code
+            try:
+                fields = self._code_to_fields[code]
+            except KeyError:
+                fields = self._code_to_fields[code] = (
+                    '"name":{0},"cat":{1}'.format(json.dumps(code.co_name),
+                                                  json.dumps(path)))
+            stack.append(frame)
+            self._buffer.append('{{{0},"ph":"B","ts":{1:.3f},{2}}}'.format(
+                fields, ts, local.head))
+        elif event == 'exception':
+            self._buffer.append(
+                '{{"name":{0},"ph":"i","s":"t","ts":{1:.3f},{2}}}'.format(
+                    json.dumps(arg[0].__name__), ts, local.head))
+        elif frame in stack:  # 'return' (of a frame we have seen called)
+            while stack and stack.pop() is not frame:
+                # (returns that have not been seen -- closing them as well)
+                self._buffer.append('{{"ph":"E","ts":{0:.3f},{1}}}'.format(
+                    ts, local.head))
+            self._buffer.append('{{"ph":"E","ts":{0:.3f},{1}}}'.format(
+                ts, local.head))
+        if len(self._buffer) >= self.buffersize:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered events to the file."""
+        buf = self._buffer
+        with self._lock:
+            chunks = [buf.popleft() for _ in range(len(buf))]
+            if chunks and not self._closed:
+                self._file.write(self._separator + ',\n'.join(chunks))
+                self._file.flush()
+                self._separator = ',\n'
+
+    def close(self):
+        if not self._closed:
+            self.flush()
+            with self._lock:
+                self._closed = True
+                self._file.write('\n]\n')
+                if self._own_file:
+                    self._file.close()
+                else:
+                    self._file.flush()
+
+
+class FoldedStacks(object):
+
+    """
+    Event sink: accumulates wall time per call stack (for flame graphs).
+
+    Each thread's stack of traced calls is maintained from call/return
+    events; a frame's self time (in microseconds) is added to its stack's
+    total.  The totals are written in Brendan Gregg's "folded" format
+    ('path:name;path:name;... microseconds' lines, e.g. for flamegraph.pl)
+    when the sink is closed (at the end of the `with` block or, if
+    `atexit` is true, at exit).
+    """
+
+    events = 'call', 'return'
+
+    def __init__(self, file,             # file path or writable file object
+                 atexit=True):           # close the sink at exit?
+        self.file = file
+        self._local = threading.local()
+        self._thread_totals = []  # per-thread dicts: folded stack -> time
+        self._closed = False
+        if atexit:
+            import atexit
+            atexit.register(self.close)
+
+    def __call__(self, frame, event, arg, path):
+        now = _clock()
+        local = self._local
+        try:
+            stack = local.stack
+        except AttributeError:
+            stack = local.stack = []  # [frame, folded stack, start, subtime]
+            local.totals = {}
+            self._thread_totals.append(local.totals)
+        if event == 'call':
+            label = '{0}:{1}'.format(path, frame.f_code.co_name)
+            stack.append([frame, (stack[-1][1] + ';' + label if stack
+                                  else label), now, 0.0])
+        elif any(entry[0] is frame for entry in stack):  # 'return'
+            popped_frame = None
+            while popped_frame is not frame:  # (calls whose returns have
+                popped_frame, folded, start, subtime = stack.pop()  # not
+                elapsed = now - start                # been seen are closed)
+                local.totals[folded] = (local.totals.get(folded, 0.0) +
+                                        elapsed - subtime)
+                if stack:
+                    stack[-1][3] += elapsed
+
+    def totals(self):
+        """Get a dict that maps folded stacks to their self times [s]."""
+        merged = {}
+        for totals in list(self._thread_totals):
+            for folded, seconds in list(totals.items()):
+                merged[folded] = merged.get(folded, 0.0) + seconds
+        return merged
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            lines = []
+            for folded, seconds in sorted(self.totals().items()):
+                microseconds = int(round(seconds * 1e6))
+                if microseconds:
+                    lines.append('{0} {1}\n'.format(folded, microseconds))
+            if isinstance(self.file, basestring):
+                with open(self.file, 'w') as f:
+                    f.writelines(lines)
+            else:
+                self.file.writelines(lines)
+                self.file.flush()
+
+
+class BinaryTraceWriter(object):
+
+    """
+    Event sink: writes compact binary trace files -- one per process.
+
+    Events (with monotonic timestamps and thread idents) are buffered and
+    appended to the '<directory>/<prefix>.<pid>.trace' file; paths and
+    names of traced code are written once per file.  If `follow_forks` is
+    true, a forked child process (e.g. a `multiprocessing` worker started
+    with the 'fork' method), which inherits the tracer, continues with
+    its own file.  Use merge_traces() (or trace_logging_merge.py) to get
+    one time-ordered trace of all the processes.
+
+    The buffer is written when it reaches `buffersize` bytes or, on an
+    event, when the last write is older than `flushinterval` seconds.  If
+    `sigterm` is true and SIGTERM has its default disposition, a handler
+    is installed (also in forked children -- e.g. workers stopped with
+    Pool.terminate()) that closes the sink and then lets the signal
+    terminate the process.
+    """
+
+    events = 'call', 'return', 'exception'
+
+    def __init__(self, directory='.',    # directory for the trace files
+                 prefix='trace',         # file name prefix
+                 buffersize=65536,       # number of bytes written at a time
+                 flushinterval=1.0,      # max age of buffered events [s]
+                 follow_forks=True,      # trace forked child processes too?
+                 atexit=True,            # close the sink at exit?
+                 sigterm=True):          # close the sink on SIGTERM?
+        self.directory = directory
+        self.prefix = prefix
+        self.buffersize = buffersize
+        self.flushinterval = flushinterval
+        self.sigterm = sigterm
+        self._open()
+        if sigterm:
+            self._install_sigterm_handler()
+        if follow_forks:
+            _register_after_fork_in_child(self._after_fork_in_child)
+        if atexit:
+            import atexit
+            atexit.register(self.close)
+
+    def _open(self):
+        self.pid = os.getpid()
+        self.path = os.path.join(self.directory, '{0}.{1}.trace'.format(
+            self.prefix, self.pid))
+        self._file = open(self.path, 'wb')
+        self._file.write(_TRACE_HEADER.pack(_TRACE_MAGIC, self.pid))
+        self._file.flush()
+        self._buffer = bytearray()
+        self._last_write = _monotonic()
+        self._code_to_label_id = {}
+        self._seen_threads = set()
+        # (calls made by the tracer are not traced, so events cannot
+        # re-enter __call__; but a signal handler calling close() can
+        # interrupt __call__ holding the lock -- see _close())
+        self._lock = threading.Lock()
+        self._owner = None    # ident of the thread holding the lock
+        self._pending = None  # 'close' or signal number -- see _close()
+        self._closed = False
+
+    def _after_fork_in_child(self):
+        if not self._closed:
+            # the buffer holds the parent's events (the file object's
+            # own buffer is always empty -- see flush()); dropping them
+            self._file.close()
+            self._open()
+            if self.sigterm:
+                self._install_sigterm_handler()
+            # (multiprocessing children exit with os._exit(), skipping
+            # atexit callbacks, but multiprocessing's finalizers are run;
+            # they can be registered after the child's bootstrap resets them)
+            mp_util = sys.modules.get('multiprocessing.util')
+            if mp_util is not None:
+                mp_util.register_after_fork(self, _register_mp_finalizer)
+
+    def __call__(self, frame, event, arg, path):
+        code = frame.f_code
+        tid = _get_thread_ident()
+        with self._lock:
+            self._owner = tid
+            try:
+                if not self._closed:
+                    self._record(tid, code, event, path)
+            finally:
+                self._owner = None
+        if self._pending is not None:
+            self._run_pending()
+
+    def _record(self, tid, code, event, path):
+        buf = self._buffer
+        if tid not in self._seen_threads:
+            self._seen_threads.add(tid)
+            name = _encode_label(threading.current_thread().name)
+            buf += _TRACE_THREAD.pack(_TRACE_KIND_THREAD, tid, len(name))
+            buf += name
+        label_id = self._code_to_label_id.get(code)
+        if label_id is None:
+            label_id = self._code_to_label_id[code] = len(
+                self._code_to_label_id)
+            label = _encode_label('{0}:{1}'.format(path, code.co_name))
+            buf += _TRACE_LABEL.pack(_TRACE_KIND_LABEL, label_id,
+                                     len(label))
+            buf += label
+        # (the timestamp is taken under the lock, so that each
+        # file's events are ordered by time, as merge_traces() needs)
+        now = _monotonic()
+        buf += _TRACE_EVENT.pack(_TRACE_EVENT_KINDS[event], now,
+                                 tid, label_id)
+        if (len(buf) >= self.buffersize or
+              now - self._last_write >= self.flushinterval):
+            self._file.write(bytes(buf))
+            self._file.flush()
+            del buf[:]
+            self._last_write = now
+
+    def _run_pending(self):
+        pending, self._pending = self._pending, None
+        if pending == 'close':
+            self.close()
+        elif pending is not None:
+            os.kill(os.getpid(), pending)  # (<- to be handled again)
+
+    def _install_sigterm_handler(self):
+        import signal
+        try:
+            if signal.getsignal(signal.SIGTERM) != signal.SIG_DFL:
+                return  # (<- the program handles SIGTERM on its own)
+            signal.signal(signal.SIGTERM, self._on_sigterm)
+        except (AttributeError, ValueError):  # (no SIGTERM/not main thread)
+            pass
+
+    def _on_sigterm(self, signum, frame):
+        import signal
+        if not self._close():
+            self._pending = signum  # (<- the signal will be sent again)
+            return
+        signal.signal(signum, signal.SIG_DFL)
+        os.kill(os.getpid(), signum)
+
+    def flush(self):
+        """Write the buffered events to the file."""
+        with self._lock:
+            if not self._closed:
+                self._file.write(bytes(self._buffer))
+                self._file.flush()
+                del self._buffer[:]
+
+    def close(self):
+        self._close()
+
+    def _close(self):
+        # -> False if closing has been left to __call__
+        if not self._lock.acquire(False):
+            owner = self._owner
+            if owner is None or owner == _get_thread_ident():
+                # we may be in a signal handler that has interrupted
+                # __call__ (holding the lock) in this thread; waiting for
+                # the lock would be a deadlock, so __call__ will close
+                # the sink when it releases the lock
+                if self._pending is None:
+                    self._pending = 'close'
+                if not self._lock.acquire(False):
+                    return False
+                self._pending = None  # (<- just released; doing it now)
+            else:
+                self._lock.acquire()  # (<- another thread will release it)
+        try:
+            self._owner = _get_thread_ident()
+            if not self._closed:
+                self._closed = True
+                self._file.write(bytes(self._buffer))
+                self._file.close()
+                del self._buffer[:]
+        finally:
+            self._owner = None
+            self._lock.release()
+        return True
+
+
+class LineCoverage(object):
+
+    """
+    Event sink: records executed lines (line coverage) in bitsets.
+
+    Lines are recorded per code object, one bit per line (nothing is
+    logged), within the scope set with trace_logging_on()'s `refdir`,
+    `negprefix` and filters.  Line events are switched off where it is
+    possible: on Py3.12+ through sys.monitoring (see trace_logging_on())
+    each line is reported once; otherwise, when all lines of a code
+    object have been seen, its frames are no longer traced.  When the
+    sink is closed (at the end of the `with` block or, if `atexit` is
+    true, at exit) the lines are dumped to the JSON `file` ({path: [line
+    numbers]}) -- merged with the ones already there, so that runs (also
+    of several processes) accumulate; see also merge_coverage().
+    """
+
+    events = 'call', 'line'
+    lines_once = True  # (each line is needed only once -- see above)
+
+    def __init__(self, file,             # coverage file path
+                 atexit=True):           # close the sink at exit?
+        self.file = file
+        self._code_to_bits = {}     # code -> bytearray (bit per line)
+        self._code_to_path = {}
+        self._code_to_missing = {}  # code -> its lines not seen yet
+        self._complete = set()      # codes whose all lines have been seen
+        self._closed = False
+        if atexit:
+            import atexit
+            atexit.register(self.close)
+
+    def __call__(self, frame, event, arg, path):
+        code = frame.f_code
+        if event == 'call':
+            return code not in self._complete  # (False -> not traced)
+        try:
+            bits = self._code_to_bits[code]
+        except KeyError:
+            bits = self._code_to_bits[code] = bytearray()
+            self._code_to_path[code] = path
+            # (Py3.11+ "line starts" include the `def` line that is
+            # never reported, so the first line is not required)
+            self._code_to_missing[code] = set(
+                lineno for _, lineno in dis.findlinestarts(code)
+                if lineno is not None and lineno != code.co_firstlineno)
+        offset = frame.f_lineno - code.co_firstlineno
+        index, mask = offset >> 3, 1 << (offset & 7)
+        if index >= len(bits):
+            bits.extend(bytearray(index + 1 - len(bits)))
+        if not bits[index] & mask:
+            bits[index] |= mask
+            missing = self._code_to_missing.get(code)
+            if missing is not None:
+                missing.discard(frame.f_lineno)
+                if not missing:
+                    del self._code_to_missing[code]
+                    self._complete.add(code)
+                    return False
+        return None
+
+    def lines(self):
+        """Get a dict that maps paths to sets of executed line numbers."""
+        path_to_lines = {}
+        for code, bits in list(self._code_to_bits.items()):
+            lines = path_to_lines.setdefault(self._code_to_path[code], set())
+            for index, byte in enumerate(bits):
+                for bit in range(8):
+                    if byte & (1 << bit):
+                        lines.add(code.co_firstlineno + index * 8 + bit)
+        return path_to_lines
+
+    def dump(self):
+        """Merge the recorded lines into the file."""
+        path_to_lines = self.lines()
+        if os.path.exists(self.file):
+            _update_coverage(path_to_lines, _load_coverage(self.file))
+        _save_coverage(path_to_lines, self.file)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.dump()
+
+
+def merge_coverage(paths, output):
+    """Merge LineCoverage's files (`paths`) into the `output` file."""
+    path_to_lines = {}
+    for path in paths:
+        _update_coverage(path_to_lines, _load_coverage(path))
+    _save_coverage(path_to_lines, output)
+
+
+def merge_traces(paths, output, chrome=False):
+    """
+    Merge BinaryTraceWriter's files into one time-ordered trace.
+
+    `paths` -- trace file paths (typically of several processes);
+    `output` -- file path or writable file object; the result is text
+    (one line per event, timestamps relative to the first event) or, if
+    `chrome` is true, Chrome trace-event JSON (for Perfetto/about:tracing).
+
+    The files are read and merged incrementally.
+    """
+    if isinstance(output, basestring):
+        with open(output, 'w') as f:
+            return merge_traces(paths, f, chrome)
+    events = _heapq_merge(*[_read_trace(path) for path in paths])
+    if chrome:
+        output.write('[\n')
+        separator = ''
+        thread_keys = set()
+        for ts, pid, _, tid, thread_name, kind, label in events:
+            head = '"pid":{0},"tid":{1}'.format(pid, tid)
+            if (pid, tid) not in thread_keys:
+                thread_keys.add((pid, tid))
+                output.write(
+                    '{0}{{"name":"thread_name","ph":"M",{1},"args":'
+                    '{{"name":{2}}}}}'.format(separator, head,
+                                               json.dumps(thread_name)))
+                separator = ',\n'
+            path, _, name = label.rpartition(':')
+            output.write(
+                '{0}{{"name":{1},"cat":{2},"ph":"{3}",{4}"ts":{5:.3f},{6}}}'
+                .format(separator, json.dumps(name), json.dumps(path),
+                        _TRACE_CHROME_PHASES[kind],
+                        '"s":"t",' if kind == _TRACE_KIND_EXCEPTION else '',
+                        ts * 1e6, head))
+            separator = ',\n'
+        output.write('\n]\n')
+    else:
+        start = None
+        for ts, pid, _, tid, thread_name, kind, label in events:
+            if start is None:
+                start = ts
+            output.write('{0:12.6f} [{1} {2}] {3}  {4}\n'.format(
+                ts - start, pid, thread_name, _TRACE_TEXT_TAGS[kind], label))
+    output.flush()
+
+
+class _ArmedTraceLogging(object):
+
+    def __init__(self, signum, controlfile, pollinterval, sinkfactory,
+                 kwargs):
+        self.signum = signum
+        self.controlfile = controlfile
+        self.pollinterval = pollinterval
+        self.sinkfactory = sinkfactory
+        self.kwargs = kwargs
+        self.overrides = {}
+        self.enabled = False
+        self._with_support = self._tracer = None
+        self._pending = None  # (enabled, overrides) from the control file
+        self._lock = threading.RLock()  # (reentrant: signal handlers...)
+        self._handling_signal = False
+        self._signals_deferred = 0
+        self._closed = threading.Event()
+        if signum is not None:
+            import signal
+            self._previous_handler = signal.signal(signum, self._on_signal)
+        if controlfile is not None:
+            watcher = threading.Thread(target=self._watch,
+                                       name='trace_logging-control')
+            watcher.daemon = True
+            watcher.start()
+
+    def enable(self, **overrides):
+        self._apply(True, overrides or None)
+
+    def disable(self):
+        self._apply(False)
+
+    def toggle(self):
+        self._apply(not self.enabled)
+
+    def close(self):
+        self._closed.set()
+        if self.signum is not None:
+            import signal
+            signal.signal(self.signum, self._previous_handler)
+            self.signum = None
+        self.disable()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _apply(self, enabled, overrides=None):
+        with self._lock:
+            if overrides is not None:
+                self.overrides = overrides
+            if self.enabled:
+                self._uninstall()
+            if enabled and not self._closed.is_set():
+                self._install()
+
+    def _install(self):
+        kwargs = dict(self.kwargs, **self.overrides)
+        if self.sinkfactory is not None:
+            kwargs['sink'] = self.sinkfactory()
+        sink = kwargs.get('sink')
+        events = (kwargs.get('events2log', default_events2log)
+                  if sink is None else sink.events)
+        self._with_support = trace_logging_on(**kwargs)
+        tracer = self._tracer = self._with_support.__enter__()
+        this_file = sys._getframe().f_code.co_filename
+        for frame in _iter_live_frames():
+            if frame.f_trace is None and (frame.f_code.co_filename
+                                          != this_file):
+                frame.f_trace = tracer
+                if _frame_has_trace_lines and 'line' not in events:
+                    frame.f_trace_lines = False
+        self.enabled = True
+
+    def _uninstall(self):
+        tracer = self._tracer
+        for frame in _iter_live_frames():
+            if frame.f_trace is tracer:
+                frame.f_trace = None
+                if _frame_has_trace_lines:
+                    frame.f_trace_lines = True
+        with_support = self._with_support
+        self._with_support = self._tracer = None
+        self.enabled = False
+        with_support.__exit__(None, None, None)
+
+    def _on_signal(self, signum, frame):
+        if self._handling_signal:  # (<- a signal within the handler)
+            self._signals_deferred += 1
+            return
+        self._handling_signal = True
+        try:
+            self._signals_deferred = 1
+            while self._signals_deferred:
+                self._signals_deferred -= 1
+                pending, self._pending = self._pending, None
+                if pending is None:
+                    self.toggle()
+                else:
+                    self._apply(*pending)
+        finally:
+            self._handling_signal = False
+
+    def _watch(self):
+        last_stamp = None
+        while not self._closed.is_set():
+            sys.settrace(None)  # (this thread is not to be traced)
+            try:
+                st = os.stat(self.controlfile)
+                stamp = st.st_mtime, st.st_size
+            except OSError:
+                stamp = None  # (no file: 'off')
+            if stamp != last_stamp:
+                last_stamp = stamp
+                state = self._read_control_file(stamp is not None)
+                if state is not None:
+                    if self.signum is not None:
+                        self._pending = state
+                        os.kill(os.getpid(), self.signum)
+                    else:
+                        self._apply(*state)
+            self._closed.wait(self.pollinterval)
+
+    def _read_control_file(self, exists):
+        if not exists:
+            return False, {}
+        argnames = trace_logging_on.__code__.co_varnames[
+            :trace_logging_on.__code__.co_argcount]
+        try:
+            with open(self.controlfile) as f:
+                lines = [line.strip() for line in f]
+            lines = [line for line in lines
+                     if line and not line.startswith('#')]
+            if not lines or lines[0] not in ('on', 'off'):
+                raise ValueError("the first line should be 'on' or 'off'")
+            overrides = {}
+            for line in lines[1:]:
+                name, _, value = line.partition('=')
+                name = name.strip()
+                if name not in argnames:
+                    raise ValueError('unknown argument: {0!r}'.format(name))
+                overrides[name] = ast.literal_eval(value.strip())
+        except (EnvironmentError, ValueError, SyntaxError):
+            exc = sys.exc_info()[1]
+            warnings.warn('trace_logging: control file {0!r} ignored ({1})'
+                          .format(self.controlfile, exc))
+            return None
+        return lines[0] == 'on', overrides
+
+
+class _TaskTiming(object):
+
+    def __init__(self, task):
+        get_name = getattr(task, 'get_name', None)  # (Py3.8+)
+        self.name = (get_name() if get_name is not None
+                     else 'Task-{0:x}'.format(id(task)))
+        get_coro = getattr(task, 'get_coro', None)  # (Py3.8+)
+        coro = get_coro() if get_coro is not None else task._coro
+        self.frame = getattr(coro, 'cr_frame', None)  # the task's own one
+        self.depth = 0  # number of running traced coroutine frames
+        self.runtime = self.awaittime = self.maxstep = 0.0
+        self.steps = 0
+        self.step_start = self.suspended_at = None
+
+    def step_began(self, now):
+        if not self.depth:
+            self.step_start = now
+            if self.suspended_at is not None:
+                self.awaittime += now - self.suspended_at
+        self.depth += 1
+
+    def step_ended(self, now):
+        if self.depth:  # (<- not if we have not seen it resumed)
+            self.depth -= 1
+            if not self.depth:
+                step = now - self.step_start
+                self.runtime += step
+                self.maxstep = max(self.maxstep, step)
+                self.steps += 1
+                self.suspended_at = now
+
+
+def _coroutine_starting(frame):
+    lasti = frame.f_lasti
+    if lasti < 0:  # (Py<3.11: not started yet)
+        return True
+    code = frame.f_code.co_code  # (Py3.11+: RESUME with oparg 0 -- start)
+    return code[lasti] == dis.opmap.get('RESUME') and not code[lasti + 1] & 3
+
+
+def _coroutine_suspending(frame):
+    code = frame.f_code.co_code
+    lasti = frame.f_lasti
+    if code[lasti] in _SUSPENDING_OPCODES:
+        return True
+    return (_YIELD_FROM is not None and sys.version_info < (3, 11)
+            and code[lasti + 2:lasti + 3] == bytes(bytearray([_YIELD_FROM])))
+
+
+class _LineMonitor(object):
+
+    # passes LINE events to a callback through sys.monitoring (Py3.12+)
+
+    @staticmethod
+    def available():
+        monitoring = getattr(sys, 'monitoring', None)
+        return (monitoring is not None and
+                monitoring.get_tool(monitoring.COVERAGE_ID) is None)
+
+    def __init__(self, callback):
+        self.callback = callback
+        self._started = False
+
+    def start(self):
+        monitoring = sys.monitoring
+        monitoring.use_tool_id(monitoring.COVERAGE_ID, 'trace_logging')
+        monitoring.register_callback(monitoring.COVERAGE_ID,
+                                     monitoring.events.LINE, self.callback)
+        monitoring.set_events(monitoring.COVERAGE_ID, monitoring.events.LINE)
+        self._started = True
+
+    def close(self):
+        if self._started:
+            self._started = False
+            monitoring = sys.monitoring
+            monitoring.set_events(monitoring.COVERAGE_ID, 0)
+            monitoring.register_callback(monitoring.COVERAGE_ID,
+                                         monitoring.events.LINE, None)
+            monitoring.free_tool_id(monitoring.COVERAGE_ID)
+            monitoring.restart_events()  # (<- re-enabling disabled lines)
+
+
+class _SamplingState(threading.local):
+    top = None      # frame of the current top-level traced call
+    skipped = None  # frame of the current sampled-out call
+
+
+class _BackgroundEmitter(object):
+
+    """
+    Per-thread buffers of log messages flushed by a background thread.
+
+    If `render` is given, buffered items are raw data to be converted
+    into log messages with it (in the background thread; None => skip).
+    """
+
+    overflow_policies = 'block', 'drop', 'dropoldest'
+
+    def __init__(self, log, interval, render=None,
+                 maxsize=None, overflow='block'):
+        if overflow not in self.overflow_policies:
+            raise ValueError('overflow must be one of: ' +
+                             ', '.join(self.overflow_policies))
+        self.log = log
+        self.interval = interval
+        self.render = render
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.dropped = 0
+        self.errors = 0  # (items whose rendering or logging failed)
+        self._local = threading.local()
+        self._buffers = []  # deques of (time, thread tag, item) tuples
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run,
+                                        name='trace_logging-flusher')
+        self._thread.daemon = True
+        self._thread.start()
+        import atexit
+        atexit.register(self.close)
+
+    def emit(self, item):
+        local = self._local
+        maxsize = self.maxsize
+        try:
+            buf = local.buffer
+        except AttributeError:
+            buf = local.buffer = deque(
+                maxlen=(maxsize if self.overflow == 'dropoldest' else None))
+            local.tag = '[{0}] '.format(threading.current_thread().name)
+            self._buffers.append(buf)
+        if maxsize is not None and len(buf) >= maxsize:
+            if self.overflow == 'block':
+                thread = self._thread
+                while (len(buf) >= maxsize and not self._closed.is_set()
+                       and thread.is_alive()):
+                    self._wakeup.set()
+                    time.sleep(0.001)
+                if not thread.is_alive():
+                    self.flush()  # (<- no flusher: doing it ourselves)
+            else:
+                self.dropped += 1
+                if self.overflow == 'drop':
+                    return
+        buf.append((_clock(), local.tag, item))
+        if self._closed.is_set():  # (<- a thread still traced after close)
+            self.flush()
+
+    def flush(self):
+        render = self.render
+        with self._lock:
+            batch = []
+            for buf in list(self._buffers):
+                batch.extend([buf.popleft() for _ in range(len(buf))])
+            batch.sort(key=itemgetter(0))
+            for _, tag, item in batch:
+                try:
+                    message = (item if render is None else render(item))
+                    if message is not None:
+                        self.log(tag + message)
+                except Exception:
+                    self.errors += 1
+                    if self.errors == 1:  # (reporting only the first one)
+                        warnings.warn('trace_logging: cannot log an event '
+                                      '({0!r})'.format(sys.exc_info()[1]))
+
+    def _run(self):
+        closed = self._closed
+        wakeup = self._wakeup
+        while not closed.is_set():
+            wakeup.wait(self.interval)
+            wakeup.clear()
+            sys.settrace(None)  # (<- the flusher itself is never traced)
+            self.flush()
+
+    def close(self):
+        if not self._closed.is_set():
+            self._closed.set()
+            self._wakeup.set()
+            self._thread.join()
+            self.flush()
+            if self.dropped:
+                self.log('trace_logging: {0} events dropped (full queue)'
+                         .format(self.dropped))
+            if self.errors:
+                self.log('trace_logging: {0} events not logged (errors)'
+                         .format(self.errors))
+
+
+def _get_threading_trace():
+    gettrace = getattr(threading, 'gettrace', None)  # (Py3.10+)
+    return (gettrace() if gettrace is not None
+            else getattr(threading, '_trace_hook', None))
+
+
+def _settrace_threads(threads_tracer, tracer):
+    settrace_all_threads = getattr(threading, 'settrace_all_threads', None)
+    if settrace_all_threads is not None:  # (Py3.12+)
+        settrace_all_threads(tracer)
+    threading.settrace(threads_tracer)
+
+
+_NOT_TOUCHED = object()
+
+
+def _iter_live_frames():
+    for frame in list(sys._current_frames().values()):
+        while frame is not None:
+            yield frame
+            frame = frame.f_back
+
+
+def _get_callargs_formatter(func, formatvalue):
+    from inspect import formatargvalues
+    getcallargs = getattr(inspect, 'getcallargs', None)  # (Py2.7+)
+    getargspec = getattr(inspect, 'getfullargspec', None)  # (Py3.x)
+    if getargspec is None:
+        getargspec = inspect.getargspec
+    spec = getargspec(func)
+    argnames = list(spec[0]) + list(getattr(spec, 'kwonlyargs', ()))
+
+    def format_callargs(args, kwargs):
+        if getcallargs is not None:
+            try:
+                callargs = getcallargs(func, *args, **kwargs)
+            except TypeError:
+                pass  # (the call itself will fail anyway)
+            else:
+                return formatargvalues(argnames, spec[1], spec[2], callargs,
+                                       formatvalue=formatvalue)
+        return '(*{0}, **{1})'.format(formatvalue(args)[1:],
+                                      formatvalue(kwargs)[1:])
+
+    return format_callargs
+
+
+def _find_owner(func_or_qualname):
+    """Get (module or class, attribute name) for a function or its name."""
+    if isinstance(func_or_qualname, basestring):
+        if ':' in func_or_qualname:
+            modulename, attrpath = func_or_qualname.split(':', 1)
+            owner = _import_module(modulename)
+        else:
+            names = func_or_qualname.split('.')
+            for i in range(len(names) - 1, 0, -1):
+                try:
+                    owner = _import_module('.'.join(names[:i]))
+                except ImportError:
+                    continue
+                attrpath = '.'.join(names[i:])
+                break
+            else:
+                raise ImportError('no module found for {0!r}'
+                                  .format(func_or_qualname))
+    else:
+        func = func_or_qualname
+        im_class = getattr(func, 'im_class', None)  # (Py2.x methods)
+        if im_class is not None:
+            return (func.__self__ if inspect.isclass(func.__self__)
+                    else im_class), func.__name__
+        owner = sys.modules[func.__module__]
+        attrpath = getattr(func, '__qualname__', None)
+        if attrpath is None:  # (Py2.x: may be a static method's function)
+            attrpath = func.__name__
+            if getattr(owner, attrpath, None) is not func:
+                for cls in list(vars(owner).values()):
+                    if (inspect.isclass(cls) and attrpath in vars(cls) and
+                          getattr(cls, attrpath) is func):
+                        return cls, attrpath
+        if '<' in attrpath:
+            raise ValueError('cannot instrument a local or anonymous '
+                             'function: {0!r}'.format(func))
+    attrnames = attrpath.split('.')
+    for attrname in attrnames[:-1]:
+        owner = getattr(owner, attrname)
+    return owner, attrnames[-1]
+
+
+def _import_module(modulename):
+    __import__(modulename)
+    return sys.modules[modulename]
+
+
+def _get_raw_attribute(owner, attrname):
+    """Get (attribute as stored in __dict__, whether owner's own) pair."""
+    if inspect.isclass(owner):
+        for cls in inspect.getmro(owner):
+            if attrname in vars(cls):
+                return vars(cls)[attrname], (cls is owner)
+    return getattr(owner, attrname), True
+
+
+def _unpatch(patches):
+    for owner, attrname, raw, is_own in reversed(patches):
+        if is_own:
+            setattr(owner, attrname, raw)
+        else:
+            delattr(owner, attrname)
+
+
+_TRACE_MAGIC = b'TLTRACE1'
+_TRACE_HEADER = struct.Struct('<8sQ')     # magic, pid
+_TRACE_KIND = struct.Struct('<B')         # (the 1st field of any record)
+_TRACE_LABEL = struct.Struct('<BIH')      # kind, label id, length (+ label)
+_TRACE_THREAD = struct.Struct('<BQH')     # kind, tid, length (+ name)
+_TRACE_EVENT = struct.Struct('<BdQI')     # kind, timestamp, tid, label id
+(_TRACE_KIND_LABEL, _TRACE_KIND_THREAD,
+ _TRACE_KIND_CALL, _TRACE_KIND_RETURN, _TRACE_KIND_EXCEPTION) = range(5)
+_TRACE_EVENT_KINDS = {
+    'call': _TRACE_KIND_CALL,
+    'return': _TRACE_KIND_RETURN,
+    'exception': _TRACE_KIND_EXCEPTION,
+}
+_TRACE_TEXT_TAGS = {
+    _TRACE_KIND_CALL: '[C  ]',
+    _TRACE_KIND_RETURN: '[  R]',
+    _TRACE_KIND_EXCEPTION: '[ E ]',
+}
+_TRACE_CHROME_PHASES = {
+    _TRACE_KIND_CALL: 'B',
+    _TRACE_KIND_RETURN: 'E',
+    _TRACE_KIND_EXCEPTION: 'i',
+}
+
+
+def _encode_label(label):
+    return label if isinstance(label, bytes) else label.encode('utf-8')
+
+
+def _decode_label(data):
+    return data if str is bytes else data.decode('utf-8', 'replace')
+
+
+def _read_trace(path):
+    # yields (timestamp, pid, seqnum, tid, thread name, event kind, label)
+    with open(path, 'rb') as f:
+        magic, pid = _TRACE_HEADER.unpack(f.read(_TRACE_HEADER.size))
+        if magic != _TRACE_MAGIC:
+            raise ValueError('{0!r} is not a trace file'.format(path))
+        record_structs = {
+            _TRACE_KIND_LABEL: _TRACE_LABEL,
+            _TRACE_KIND_THREAD: _TRACE_THREAD,
+        }
+        labels = {}
+        thread_names = {}
+        seqnum = 0
+        while True:
+            data = f.read(_TRACE_KIND.size)
+            if not data:
+                break
+            kind, = _TRACE_KIND.unpack(data)
+            record_struct = record_structs.get(kind, _TRACE_EVENT)
+            data += f.read(record_struct.size - len(data))
+            if len(data) < record_struct.size:
+                break  # (truncated, e.g. the process was killed)
+            if kind == _TRACE_KIND_LABEL:
+                _, label_id, length = record_struct.unpack(data)
+                labels[label_id] = _decode_label(f.read(length))
+            elif kind == _TRACE_KIND_THREAD:
+                _, tid, length = record_struct.unpack(data)
+                thread_names[tid] = _decode_label(f.read(length))
+            else:
+                _, ts, tid, label_id = record_struct.unpack(data)
+                seqnum += 1
+                yield (ts, pid, seqnum, tid, thread_names.get(tid, str(tid)),
+                       kind, labels[label_id])
+
+
+def _register_mp_finalizer(sink):
+    from multiprocessing.util import Finalize
+    Finalize(None, sink.close, exitpriority=0)
+
+
+_after_fork_in_child_hooks = []
+
+
+def _register_after_fork_in_child(func):
+    register_at_fork = getattr(os, 'register_at_fork', None)
+    if register_at_fork is not None:  # (Py3.7+)
+        register_at_fork(after_in_child=func)
+        return
+    if not _after_fork_in_child_hooks:
+        # older Pythons: os.fork() (used also by multiprocessing) is wrapped
+        original_fork = os.fork
+
+        @functools.wraps(original_fork)
+        def fork():
+            pid = original_fork()
+            if pid == 0:
+                for hook in _after_fork_in_child_hooks:
+                    hook()
+            return pid
+
+        os.fork = fork
+    _after_fork_in_child_hooks.append(func)
+
+
+def _load_coverage(path):
+    with open(path) as f:
+        return dict((filepath, set(lines))
+                    for filepath, lines in json.load(f).items())
+
+
+def _update_coverage(path_to_lines, other):
+    for filepath, lines in other.items():
+        path_to_lines.setdefault(filepath, set()).update(lines)
+
+
+def _save_coverage(path_to_lines, path):
+    temp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+    with open(temp_path, 'w') as f:
+        json.dump(dict((filepath, sorted(lines))
+                       for filepath, lines in path_to_lines.items()),
+                  f, indent=0, sort_keys=True)
+    getattr(os, 'replace', os.rename)(temp_path, path)  # (atomic)
+
+
+def _get_log(logger, loggermethod):
+    if isinstance(logger, basestring):
+        from logging import getLogger
+        logger = getLogger(logger)
+    return getattr(logger, loggermethod)
+
+
+@contextmanager
+def _restoring_support(wrappers, patches):
+    try:
+        yield wrappers
+    finally:
+        _unpatch(patches)
+
+
 @contextmanager
-def _with_statement_support(tracer, previous):
-    yield tracer
-    sys.settrace(previous)
+def _with_statement_support(tracer, previous, threads_previous=_NOT_TOUCHED,
+                            to_close=()):
+    try:
+        yield tracer
+    finally:
+        tracer.active = False  # (<- for threads we cannot settrace())
+        sys.settrace(previous)
+        if threads_previous is not _NOT_TOUCHED:
+            _settrace_threads(threads_previous, previous)
+        for obj in to_close:
+            close = getattr(obj, 'close', None)
+            if close is not None:
+                close()
 
 
 if __name__ == '__main__':
@@ -118,7 +2186,17 @@ if __name__ == '__main__':
             arthur('2 sheds')
         arthur(3)
     arthur(4)  # (<- not logged)
+    recorder = FlightRecorder(dumpsize=5, logger='black.box',
+                              summaryfunc=(lambda frame, event, arg:
+                                           type(arg).__name__))
+    with trace_logging_on(sink=recorder):
+        arthur(5)  # (<- recorded, not logged)
+    recorder.dump()  # (<- the last 5 events logged)
+    with trace_logging_on(sink=CallStats(logger='black.box', atexit=False)):
+        arthur(6)  # (<- summary table logged at the end of the block)
+    with trace_functions(lancelot, logger='brave.sir.robin'):
+        arthur(7)  # (<- only lancelot() calls logged; no global tracer)
     trace_logging_on(filterarg='{name}',
                      filterfunc=methodcaller('startswith', 'r'),
                      logger='comfy.chair', loggermethod='info', reprfunc=repr)
-    arthur(5)
+    arthur(8)
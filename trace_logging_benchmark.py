@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# Copyright (c) 2010-2011 Jan Kaliszewski (zuo). All rights reserved.
+# Licensed under the MIT License. Python 2.6/2.7/3.x-compatibile.
+
+"""
+Overhead benchmark for trace_logging: representative workloads run
+untraced and under a matrix of trace_logging_on() configurations.
+
+Reported numbers are slowdown factors (traced time / untraced time),
+the best of a few repetitions.  Usage:
+
+    python trace_logging_benchmark.py [repeat]
+"""
+
+import logging
+import os.path
+import sys
+import time
+import types
+
+from trace_logging import (trace_logging_on, trace_functions, bounded_repr,
+                           FlightRecorder, CallStats)
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+#
+# workloads
+
+def fib(n):
+    return n if n < 2 else fib(n - 1) + fib(n - 2)
+
+def add(a, b):
+    return a + b
+
+def fail(i):
+    raise ValueError(i)
+
+
+def workload_recursion():
+    "recursive calls"
+    for i in range(50):
+        fib(12)
+
+def workload_small_calls():
+    "tight loop of small calls"
+    for i in range(50000):
+        add(i, 1)
+
+def workload_exceptions():
+    "exception-heavy code"
+    for i in range(10000):
+        try:
+            fail(i)
+        except ValueError:
+            pass
+
+def workload_genexpr():
+    "generator expressions"
+    for i in range(500):
+        sum(x * 2 for x in range(100))
+
+
+workloads = (
+    workload_recursion,
+    workload_small_calls,
+    workload_exceptions,
+    workload_genexpr,
+)
+
+
+#
+# trace_logging configurations
+
+try:
+    NullHandler = logging.NullHandler
+except AttributeError:  # (Py2.6)
+    class NullHandler(logging.Handler):
+        def emit(self, record):
+            pass
+
+null_logger = logging.getLogger('trace_logging_benchmark.null')
+null_logger.addHandler(NullHandler())
+null_logger.propagate = False
+null_logger.setLevel(logging.DEBUG)
+
+this_file = os.path.basename(__file__)
+if this_file.endswith(('.pyc', '.pyo')):
+    this_file = this_file[:-1]
+
+def untraced_loops(configuration):
+    # (with it the workload's own frame -- its loop -- is not traced, so
+    # the calls it makes are top-level ones: the units of `samplerate`)
+    configuration.untraced_loops = True
+    return configuration
+
+configurations = (
+    ('filtered out by negprefix',
+     lambda: trace_logging_on(negprefix=(this_file,), logger=null_logger)),
+    ('filtered out by filterfunc',
+     lambda: trace_logging_on(filterfunc=(lambda s: False),
+                              logger=null_logger)),
+    ('logged to a null handler',
+     lambda: trace_logging_on(logger=null_logger)),
+    ('logged to a null handler, bounded_repr',
+     lambda: trace_logging_on(logger=null_logger, reprfunc=bounded_repr)),
+    ('logged, 1% of top-level calls sampled',
+     untraced_loops(lambda: trace_logging_on(logger=null_logger,
+                                             samplerate=0.01))),
+    ('logged, async_emit',
+     lambda: trace_logging_on(logger=null_logger, async_emit=True)),
+    ('FlightRecorder sink',
+     lambda: trace_logging_on(sink=FlightRecorder(excepthook=False))),
+    ('CallStats sink',
+     lambda: trace_logging_on(sink=CallStats(logger=null_logger,
+                                             atexit=False))),
+    ('trace_functions(add, fail), null handler',
+     lambda: trace_functions(add, fail, logger=null_logger)),
+)
+
+
+#
+# the benchmark
+
+UNTRACED_FILENAME = os.sep + '<untraced workload loop>'  # (negprefix '..')
+
+_CODE_ARGS = ('co_argcount', 'co_kwonlyargcount', 'co_nlocals',
+              'co_stacksize', 'co_flags', 'co_code', 'co_consts',
+              'co_names', 'co_varnames', 'co_filename', 'co_name',
+              'co_firstlineno', 'co_lnotab', 'co_freevars', 'co_cellvars')
+
+def untraced_copy(func):
+    code = func.__code__
+    if hasattr(code, 'replace'):  # (Py3.8+)
+        code = code.replace(co_filename=UNTRACED_FILENAME)
+    else:
+        code = types.CodeType(*[
+            (UNTRACED_FILENAME if name == 'co_filename'
+             else getattr(code, name))
+            for name in _CODE_ARGS if hasattr(code, name)])
+    return types.FunctionType(code, func.__globals__, func.__name__)
+
+
+def measure(workload, repeat, configuration=None):
+    if getattr(configuration, 'untraced_loops', False):
+        workload = untraced_copy(workload)
+    results = []
+    for i in range(repeat):
+        if configuration is None:
+            start = _clock()
+            workload()
+            results.append(_clock() - start)
+        else:
+            with configuration():
+                start = _clock()
+                workload()
+                results.append(_clock() - start)
+    return min(results)
+
+
+def main(repeat=3):
+    print('%r: trace_logging overhead (slowdown factors, best of %d)' %
+          (sys.argv[0], repeat))
+    baselines = [measure(workload, repeat) for workload in workloads]
+    print('\nworkloads (untraced time):')
+    for i, (workload, baseline) in enumerate(zip(workloads, baselines)):
+        print('  #%d %s: %f s' % (i + 1, workload.__doc__, baseline))
+    print('\n%-42s' % 'configuration' +
+          ''.join('%10s' % ('#%d' % (i + 1)) for i in range(len(workloads))))
+    for description, configuration in configurations:
+        factors = [measure(workload, repeat, configuration) / baseline
+                   for workload, baseline in zip(workloads, baselines)]
+        print('%-42s' % description +
+              ''.join('%9.1fx' % factor for factor in factors))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:2]))
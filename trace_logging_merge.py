@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+# Copyright (c) 2010-2011 Jan Kaliszewski (zuo). All rights reserved.
+# Licensed under the MIT License. Python 2.6/2.7/3.x-compatibile.
+
+"""
+Merge per-process trace files (written by trace_logging's
+BinaryTraceWriter sink) into one time-ordered trace.  Usage:
+
+    python trace_logging_merge.py [--chrome] OUTPUT TRACEFILE...
+
+The output is text or, with --chrome, Chrome trace-event JSON
+(for Perfetto/about:tracing).
+"""
+
+from optparse import OptionParser
+
+from trace_logging import merge_traces
+
+
+def main(argv=None):
+    parser = OptionParser(usage='%prog [--chrome] OUTPUT TRACEFILE...')
+    parser.add_option('-c', '--chrome', action='store_true', default=False,
+                      help='write Chrome trace-event JSON instead of text')
+    options, args = parser.parse_args(argv)
+    if len(args) < 2:
+        parser.error('OUTPUT and at least one TRACEFILE are required')
+    merge_traces(args[1:], args[0], chrome=options.chrome)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,672 @@
+#!/usr/bin/env python
+# Copyright (c) 2010-2011 Jan Kaliszewski (zuo). All rights reserved.
+# Licensed under the MIT License. Python 2.6/2.7/3.x-compatibile.
+
+import json
+import os
+import os.path
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import warnings
+
+import trace_logging
+from trace_logging import *
+from trace_logging import _TRACE_HEADER
+
+
+#
+# traced functions (and other helpers)
+
+this_dir = os.path.dirname(os.path.abspath(__file__))
+
+# (the functions of the trace_logging module are out of the scope)
+scope = dict(refdir=this_dir, negprefix=('..', '<', 'trace_logging.py'))
+
+def leaf(x):
+    return x
+
+def recurse(n):
+    if n:
+        return recurse(n - 1)
+    return leaf(n)
+
+def fail():
+    raise ValueError
+
+class TempDirTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+def slow():
+    time.sleep(0.05)
+    return leaf('slow')
+
+def worker(stop):
+    i = 0
+    while not stop.is_set():
+        leaf(i)
+        i += 1
+        time.sleep(0.005)
+
+def run_in_thread(func, timeout=20.0):
+    # -> whether func() finished within `timeout` (not hanging)
+    thread = threading.Thread(target=func)
+    thread.daemon = True
+    thread.start()
+    thread.join(timeout)
+    return not thread.is_alive()
+
+class Thing(object):
+
+    @staticmethod
+    def double(x):
+        return 2 * x
+
+    @classmethod
+    def name(cls):
+        return cls.__name__
+
+asyncio_source = '''
+async def leaf(n):
+    await asyncio.sleep(0.01)
+    return n
+
+async def job(n):
+    x = await leaf(n)
+    await asyncio.sleep(0.01)
+    return x
+
+async def main():
+    return await asyncio.gather(job(1), job(2))
+'''  # (compiled only on Py3.7+)
+
+def branchy(x):
+    if x:
+        return 'yes'
+    return 'no'
+
+
+#
+# actual tests
+
+class TestFlightRecorder(unittest.TestCase):
+
+    def setUp(self):
+        self.messages = []
+
+    def make_recorder(self, **kwargs):
+        return FlightRecorder(logger=self.messages, loggermethod='append',
+                              **kwargs)
+
+    def test_dump_of_the_last_events(self):
+        recorder = self.make_recorder(
+            size=3, summaryfunc=(lambda frame, event, arg: repr(arg)))
+        with trace_logging_on(sink=recorder, **scope):
+            for i in range(5):
+                leaf(i)
+        self.assertEqual(self.messages, [])
+        recorder.dump(2)
+        self.assertEqual(self.messages[0],
+                         'FlightRecorder: the last 2 recorded events')
+        self.assertTrue(self.messages[1].startswith('[C  ] -'))
+        self.assertTrue(self.messages[1].endswith(
+            ': trace_logging_test.py: leaf'))
+        self.assertTrue(self.messages[2].startswith('[  R] +0.000000s '))
+        self.assertTrue(self.messages[2].endswith('leaf  ->  4'))
+
+    def test_triggers_uninstalled_on_close(self):
+        excepthook = sys.excepthook
+        threading_excepthook = getattr(threading, 'excepthook', None)
+        signum = getattr(signal, 'SIGUSR1', None)
+        if signum is not None:
+            handler = signal.getsignal(signum)
+        recorder = self.make_recorder(signum=signum)
+        self.assertTrue(sys.excepthook is not excepthook)
+        with trace_logging_on(sink=recorder, **scope):
+            leaf(1)
+            if signum is not None:
+                os.kill(os.getpid(), signum)
+                self.assertEqual(len(self.messages), 3)  # (<- dumped)
+        self.assertTrue(sys.excepthook is excepthook)
+        self.assertTrue(getattr(threading, 'excepthook', None)
+                        is threading_excepthook)
+        if signum is not None:
+            self.assertEqual(signal.getsignal(signum), handler)
+
+    def test_dump_on_leaving_with_exception(self):
+        excepthook = sys.excepthook
+        try:
+            with trace_logging_on(sink=self.make_recorder(), **scope):
+                leaf(1)
+                raise ZeroDivisionError
+        except ZeroDivisionError:
+            pass
+        self.assertEqual(self.messages[0],
+                         'FlightRecorder: the last 2 recorded events')
+        self.assertTrue(sys.excepthook is excepthook)
+
+    def test_hook_replaced_by_someone_else(self):
+        excepthook = sys.excepthook
+        passed = []
+        sys.excepthook = lambda *exc_info: passed.append(exc_info[0])
+        try:
+            recorder = self.make_recorder()
+            recorder_hook = sys.excepthook
+            def other_hook(*exc_info):
+                recorder_hook(*exc_info)
+            sys.excepthook = other_hook
+            recorder.close()
+            self.assertTrue(sys.excepthook is other_hook)  # (<- kept)
+            other_hook(ValueError, ValueError(), None)
+        finally:
+            sys.excepthook = excepthook
+        self.assertEqual(passed, [ValueError])
+        self.assertEqual(self.messages, [])  # (<- closed: no dump)
+
+
+class TestCallStats(unittest.TestCase):
+
+    def test_rows_and_summary(self):
+        messages = []
+        stats = CallStats(sortby='calls', logger=messages,
+                          loggermethod='append', atexit=False)
+        with trace_logging_on(sink=stats, **scope):
+            for i in range(3):
+                recurse(2)
+            try:
+                fail()
+            except ValueError:
+                pass
+        rows = stats.rows()
+        self.assertEqual([row[2] for row in rows],
+                         ['recurse', 'leaf', 'fail'])
+        (path, lineno, name, calls, total, self_,
+         exceptions, maxdepth) = rows[0]
+        self.assertEqual((path, lineno, calls, exceptions, maxdepth),
+                         ('trace_logging_test.py',
+                          recurse.__code__.co_firstlineno, 9, 0, 3))
+        self.assertTrue(total >= self_ >= 0)
+        self.assertEqual(rows[1][3:4] + rows[1][6:], (3, 0, 4))
+        self.assertEqual(rows[2][3:4] + rows[2][6:], (1, 1, 1))
+        self.assertEqual(len(messages), 1)  # (<- dumped on close)
+        self.assertTrue(messages[0].startswith(
+            'CallStats summary (sorted by calls):'))
+        self.assertEqual(len(messages[0].splitlines()), 5)
+
+    def test_limit_and_bad_sortby(self):
+        stats = CallStats(limit=1, atexit=False)
+        with trace_logging_on(sink=stats, **scope):
+            recurse(1)
+        self.assertEqual(len(stats.rows()), 1)
+        self.assertRaises(ValueError, CallStats, sortby='bogus',
+                          atexit=False)
+
+
+class TestSampling(unittest.TestCase):
+
+    def traced_calls(self, func, **kwargs):
+        messages = []
+        with trace_logging_on(logger=messages, loggermethod='append',
+                              events2log={'call': '{name}{callargs}'},
+                              **dict(scope, **kwargs)) as tracer:
+            for i in range(10):
+                func(i % 2 if func is recurse else i)
+        return messages, tracer
+
+    def test_sampleevery(self):
+        messages, _ = self.traced_calls(leaf, sampleevery=3)
+        self.assertEqual(messages, ['leaf(x=0)', 'leaf(x=3)', 'leaf(x=6)',
+                                    'leaf(x=9)'])
+
+    def test_samplerate(self):
+        messages, _ = self.traced_calls(recurse, samplerate=0.0)
+        self.assertEqual(messages, [])
+        messages, _ = self.traced_calls(recurse, samplerate=0.5)
+        # (whole subtrees of top-level calls are traced or skipped)
+        self.assertEqual(len([m for m in messages if m.startswith('leaf')]),
+                         len([m for m in messages if m == 'recurse(n=0)']))
+
+    def test_maxrate(self):
+        messages, tracer = self.traced_calls(leaf, maxrate=5)
+        self.assertTrue(0 < len(messages) <= 5)
+        self.assertTrue(tracer.dropped > 0)
+
+
+class TestChromeTraceWriter(TempDirTestCase):
+
+    def test_valid_json(self):
+        path = self.path('trace.json')
+        with trace_logging_on(sink=ChromeTraceWriter(path, buffersize=3,
+                                                     atexit=False), **scope):
+            recurse(2)
+            try:
+                fail()
+            except ValueError:
+                pass
+        with open(path) as f:
+            events = json.load(f)
+        phases = [event['ph'] for event in events]
+        self.assertEqual(phases[0], 'M')  # (the thread name)
+        self.assertEqual(phases[1:], ['B', 'B', 'B', 'B', 'E', 'E', 'E', 'E',
+                                      'B', 'i', 'E'])
+        self.assertEqual([event['name'] for event in events[1:5]],
+                         ['recurse', 'recurse', 'recurse', 'leaf'])
+        self.assertEqual(events[1]['cat'], 'trace_logging_test.py')
+        self.assertEqual(events[-2]['name'], 'ValueError')
+        timestamps = [event['ts'] for event in events[1:]]
+        self.assertEqual(timestamps, sorted(timestamps))
+
+
+class TestMinDuration(unittest.TestCase):
+
+    def test_only_slow_calls_logged(self):
+        messages = []
+        with trace_logging_on(logger=messages, loggermethod='append',
+                              min_duration=0.02, childtimes=True, **scope):
+            leaf(1)
+            slow()
+        self.assertEqual(len(messages), 3)
+        self.assertEqual(messages[0], '[C  ] trace_logging_test.py: slow()')
+        self.assertEqual(messages[1],
+                         "[  R] trace_logging_test.py: slow  ->  'slow'")
+        self.assertTrue(messages[2].startswith(
+            '[ S ] trace_logging_test.py: slow  took 0.0'))
+        self.assertTrue('leaf' in messages[2])  # (<- child times)
+
+
+class TestAllThreads(unittest.TestCase):
+
+    def test_threads_started_within_with_block(self):
+        messages = []
+        stop = threading.Event()
+        with trace_logging_on(logger=messages, loggermethod='append',
+                              all_threads=True, flushinterval=0.01,
+                              **scope):
+            thread = threading.Thread(target=worker, args=(stop,),
+                                      name='the-worker')
+            thread.start()
+            time.sleep(0.05)
+        try:
+            logged = len(messages)
+            self.assertTrue(logged > 0)
+            self.assertTrue(messages[0].startswith('[the-worker] [C  ] '))
+            time.sleep(0.05)
+            self.assertEqual(len(messages), logged)  # (no more events)
+        finally:
+            stop.set()
+            thread.join()
+
+
+class TestAsyncEmit(unittest.TestCase):
+
+    def test_same_messages_as_synchronous(self):
+        results = []
+        for async_emit in (False, True):
+            messages = []
+            with trace_logging_on(logger=messages, loggermethod='append',
+                                  async_emit=async_emit, **scope):
+                recurse(2)
+                try:
+                    fail()
+                except ValueError:
+                    pass
+            results.append(messages)
+        self.assertEqual(len(results[0]), 11)
+        # (logged by the background thread -- prefixed with thread names)
+        self.assertEqual([m.split('] ', 1)[1] for m in results[1]],
+                         results[0])
+        self.assertTrue(results[1][0].startswith('[MainThread] '))
+
+    def test_render_errors_do_not_hang(self):
+        messages = []
+        def traced():
+            # (frames are not available when rendering in the background)
+            with trace_logging_on(logger=messages, loggermethod='append',
+                                  async_emit=True, queuesize=20,
+                                  filterarg='{frame.f_lineno}', **scope):
+                for i in range(500):
+                    leaf(i)
+        with warnings.catch_warnings(record=True):
+            warnings.simplefilter('always')
+            self.assertTrue(run_in_thread(traced))
+        self.assertTrue(messages[-1].endswith('events not logged (errors)'))
+
+    def test_incompatible_arguments(self):
+        self.assertRaises(ValueError, trace_logging_on, async_emit=True,
+                          min_duration=0.1)
+        self.assertRaises(ValueError, trace_logging_on, async_emit=True,
+                          sink=CallStats(atexit=False))
+        self.assertTrue(sys.gettrace() is None)
+
+
+class TestFoldedStacks(TempDirTestCase):
+
+    def test_folded_lines(self):
+        path = self.path('stacks.folded')
+        with trace_logging_on(sink=FoldedStacks(path, atexit=False),
+                              **scope):
+            slow()
+            recurse(0)
+        with open(path) as f:
+            lines = f.read().splitlines()
+        stacks = dict(line.rsplit(' ', 1) for line in lines)
+        self.assertTrue(int(stacks['trace_logging_test.py:slow']) >= 40000)
+        for stack in stacks:
+            self.assertTrue(stack in ('trace_logging_test.py:slow',
+                                      'trace_logging_test.py:slow;'
+                                      'trace_logging_test.py:leaf',
+                                      'trace_logging_test.py:recurse',
+                                      'trace_logging_test.py:recurse;'
+                                      'trace_logging_test.py:leaf'))
+
+
+class TestTraceFunctions(unittest.TestCase):
+
+    def test_patching_and_restoring(self):
+        messages = []
+        original_leaf = leaf
+        raw_double = Thing.__dict__['double']
+        raw_name = Thing.__dict__['name']
+        with trace_functions(leaf, __name__ + ':Thing.double', Thing.name,
+                             refdir=this_dir, logger=messages,
+                             loggermethod='append'):
+            self.assertTrue(leaf is not original_leaf)  # (<- patched)
+            self.assertEqual(recurse(1), 0)
+            self.assertEqual(Thing.double(2), 4)
+            self.assertEqual(Thing().name(), 'Thing')
+        self.assertTrue(leaf is original_leaf)
+        self.assertTrue(Thing.__dict__['double'] is raw_double)
+        self.assertTrue(Thing.__dict__['name'] is raw_name)
+        self.assertEqual(messages, [
+            '[C  ] trace_logging_test.py: leaf(x=0)',
+            '[  R] trace_logging_test.py: leaf  ->  0',
+            '[C  ] trace_logging_test.py: double(x=2)',
+            '[  R] trace_logging_test.py: double  ->  4',
+            messages[4],
+            "[  R] trace_logging_test.py: name  ->  'Thing'"])
+        self.assertTrue(messages[4].startswith(
+            "[C  ] trace_logging_test.py: name(cls=<class '"))
+
+    def test_exceptions(self):
+        messages = []
+        with trace_functions(fail, refdir=this_dir, logger=messages,
+                             loggermethod='append'):
+            self.assertRaises(ValueError, fail)
+        self.assertEqual(len(messages), 3)
+        self.assertTrue(messages[1].startswith(
+            '[ E ] trace_logging_test.py, in fail:\nTraceback'))
+
+    def test_bad_arguments(self):
+        self.assertRaises(TypeError, trace_functions, leaf, bogus=1)
+        self.assertRaises(TypeError, trace_functions, len)
+
+
+class TestBoundedRepr(unittest.TestCase):
+
+    def test_truncation(self):
+        brepr = BoundedRepr(maxdepth=2, maxitems=3, maxstring=5,
+                            maxother=10, maxtotal=60)
+        self.assertEqual(brepr('abcdefgh'), "'abcde...'")
+        self.assertEqual(brepr(list(range(10))), '[0, 1, 2, ...]')
+        self.assertEqual(brepr([[[1]], (2,)]), '[[[...]], (2,)]')
+        self.assertEqual(brepr({'a': {'b': {'c': 1}}}), "{'a': {'b': {...}}}")
+        self.assertEqual(brepr(2.0 ** 100), '1.2...e+30')
+        self.assertEqual(len(brepr([['x' * 100] * 3] * 3)), 60)
+
+    def test_array_like_and_register(self):
+        class ArrayLike(object):
+            shape = (2, 3)
+            dtype = 'int8'
+            def __repr__(self):
+                raise AssertionError('repr() should not be called')
+        brepr = BoundedRepr()
+        self.assertEqual(brepr(ArrayLike()),
+                         '<ArrayLike shape=(2, 3) dtype=int8>')
+        brepr.register(ArrayLike, lambda obj: '<array>')
+        self.assertEqual(brepr([ArrayLike()]), '[<array>]')
+
+    def test_caching(self):
+        brepr = BoundedRepr(cacheminlen=10)
+        big_tuple = tuple(range(20))
+        self.assertTrue(brepr(big_tuple) is brepr(big_tuple))
+        big_list = list(range(20))  # (mutable -- not cached)
+        before = brepr(big_list)
+        big_list[0] = 'changed'
+        self.assertNotEqual(brepr(big_list), before)
+        tuple_of_list = tuple([[0]] * 20)  # (not immutable through and
+        before = brepr(tuple_of_list)      # through -- not cached)
+        tuple_of_list[0][0] = 'changed'
+        self.assertNotEqual(brepr(tuple_of_list), before)
+
+    def test_as_reprfunc(self):
+        messages = []
+        with trace_logging_on(logger=messages, loggermethod='append',
+                              reprfunc=bounded_repr, **scope):
+            leaf('x' * 1000)
+        self.assertTrue(len(messages[0]) < 200)
+
+
+class TestBinaryTraceWriter(TempDirTestCase):
+
+    def make_sink(self, **kwargs):
+        return BinaryTraceWriter(self.directory, follow_forks=False,
+                                 atexit=False, sigterm=False, **kwargs)
+
+    def test_merged_traces(self):
+        sinks = [self.make_sink(prefix='a'), self.make_sink(prefix='b')]
+        for sink in sinks:
+            with trace_logging_on(sink=sink, **scope):
+                recurse(1)
+        text_path = self.path('merged.txt')
+        merge_traces([sink.path for sink in sinks], text_path)
+        with open(text_path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 12)
+        self.assertTrue(lines[0].endswith(
+            ' MainThread] [C  ]  trace_logging_test.py:recurse'))
+        chrome_path = self.path('merged.json')
+        merge_traces([sink.path for sink in sinks], chrome_path, chrome=True)
+        with open(chrome_path) as f:
+            events = json.load(f)
+        self.assertEqual([event['ph'] for event in events].count('B'), 6)
+
+    def test_flushinterval(self):
+        sink = self.make_sink(flushinterval=0.0)
+        try:
+            with trace_logging_on(sink=sink, **scope):
+                leaf(1)
+                # (written although the sink is not closed yet)
+                self.assertTrue(os.path.getsize(sink.path) >
+                                _TRACE_HEADER.size)
+        finally:
+            sink.close()
+
+    def test_closing_within_call(self):
+        # (e.g. by a signal handler that interrupted the sink's __call__
+        # in the same thread; it must not wait for the lock -- a deadlock)
+        sink = self.make_sink()
+        encode_label = trace_logging._encode_label
+        def traced():
+            def closing_encode_label(label):
+                sink.close()
+                return encode_label(label)
+            trace_logging._encode_label = closing_encode_label
+            try:
+                with trace_logging_on(sink=sink, **scope):
+                    leaf(1)
+                    leaf(2)  # (<- the sink is closed already)
+            finally:
+                trace_logging._encode_label = encode_label
+        self.assertTrue(run_in_thread(traced))
+        self.assertTrue(sink._file.closed)
+        merge_traces([sink.path], self.path('merged.txt'))
+        with open(self.path('merged.txt')) as f:
+            self.assertEqual(len(f.read().splitlines()), 1)
+
+
+class TestTraceLoggingArmed(unittest.TestCase):
+
+    def test_enable_and_disable(self):
+        messages = []
+        armed = trace_logging_armed(logger=messages, loggermethod='append',
+                                    all_threads=False, **scope)
+        try:
+            leaf(1)
+            self.assertFalse(armed.enabled)
+            armed.enable()
+            leaf(2)
+            armed.disable()
+            leaf(3)
+            armed.enable(events2log={'call': '{name}{callargs}'})
+            leaf(4)
+        finally:
+            armed.close()
+        leaf(5)
+        self.assertEqual(messages, [
+            '[C  ] trace_logging_test.py: leaf(x=2)',
+            '[  R] trace_logging_test.py: leaf  ->  2',
+            'leaf(x=4)'])
+
+    def test_sinks_closed_on_disabling(self):
+        sinks = []
+        def sinkfactory():
+            sinks.append(CallStats(logger=[], loggermethod='append',
+                                   atexit=False))
+            return sinks[-1]
+        with trace_logging_armed(sinkfactory=sinkfactory, all_threads=False,
+                                 **scope) as armed:
+            armed.toggle()
+            recurse(1)
+            armed.toggle()
+            armed.toggle()
+        self.assertEqual(len(sinks), 2)
+        self.assertEqual([sink._closed for sink in sinks], [True, True])
+        self.assertEqual(sinks[0].rows()[0][3], 2)
+
+    def test_signal_within_toggle(self):
+        messages = []
+        def sinkfactory():
+            if not messages:
+                messages.append('created')
+                armed._on_signal(None, None)  # (<- a nested signal)
+            return FlightRecorder(excepthook=False)
+        armed = trace_logging_armed(sinkfactory=sinkfactory,
+                                    all_threads=False, **scope)
+        try:
+            armed._on_signal(None, None)
+            # (enabled, then -- by the nested signal -- disabled)
+            self.assertFalse(armed.enabled)
+        finally:
+            armed.close()
+
+    def test_controlfile(self):
+        directory = tempfile.mkdtemp()
+        try:
+            controlfile = os.path.join(directory, 'control')
+            with open(controlfile, 'w') as f:
+                f.write("on\nevents2log = {'call': '{name}'}\n")
+            messages = []
+            armed = trace_logging_armed(controlfile=controlfile,
+                                        pollinterval=0.01, logger=messages,
+                                        loggermethod='append', **scope)
+            try:
+                deadline = time.time() + 10
+                while not armed.enabled and time.time() < deadline:
+                    time.sleep(0.01)
+                self.assertTrue(armed.enabled)
+                self.assertEqual(armed.overrides,
+                                 {'events2log': {'call': '{name}'}})
+            finally:
+                armed.close()
+            self.assertFalse(armed.enabled)
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestAsyncioTasks(unittest.TestCase):
+
+    def test_suspensions_and_task_summaries(self):
+        try:
+            import asyncio
+            asyncio.current_task
+        except (ImportError, AttributeError):  # (Py<3.7)
+            return
+        namespace = {'asyncio': asyncio}
+        exec(compile(asyncio_source, __file__, 'exec'), namespace)
+        main = namespace['main']
+        messages = []
+        with trace_logging_on(logger=messages, loggermethod='append',
+                              asyncio_tasks=True, **scope):
+            loop = asyncio.new_event_loop()
+            try:
+                self.assertEqual(loop.run_until_complete(main()), [1, 2])
+            finally:
+                loop.close()
+        suspends = [m for m in messages if '[ <~]' in m]
+        tasks_done = [m for m in messages if 'task done' in m]
+        # (main: 1 await; job: 2 awaits, leaf: 1 -- in 2 tasks)
+        self.assertEqual(len(suspends), 1 + 2 * (2 + 1))
+        self.assertEqual(len(tasks_done), 3)
+        for message in tasks_done:
+            self.assertFalse(message.endswith(' 0.000000s awaiting'))
+
+    def test_incompatible_arguments(self):
+        for kwargs in (dict(sink=CallStats(atexit=False)),
+                       dict(min_duration=0.1), dict(async_emit=True)):
+            self.assertRaises(ValueError, trace_logging_on,
+                              asyncio_tasks=True, **kwargs)
+        self.assertTrue(sys.gettrace() is None)
+
+
+class TestLineCoverage(TempDirTestCase):
+
+    def cover(self, path, *args):
+        coverage = LineCoverage(path, atexit=False)
+        with trace_logging_on(sink=coverage, **scope):
+            for arg in args:
+                branchy(arg)
+        return coverage
+
+    def branchy_lines(self, path_to_lines):
+        first = branchy.__code__.co_firstlineno
+        return sorted(line - first for line
+                      in path_to_lines['trace_logging_test.py']
+                      if first < line <= first + 3)
+
+    def load(self, path):
+        with open(path) as f:
+            return json.load(f)
+
+    def test_lines(self):
+        coverage = self.cover(self.path('a.json'), True)
+        self.assertEqual(self.branchy_lines(coverage.lines()), [1, 2])
+        self.assertEqual(self.branchy_lines(self.load(self.path('a.json'))),
+                         [1, 2])
+
+    def test_accumulating_and_merging(self):
+        self.cover(self.path('a.json'), True)
+        self.cover(self.path('b.json'), False)
+        merge_coverage([self.path('a.json'), self.path('b.json')],
+                       self.path('merged.json'))
+        self.assertEqual(
+            self.branchy_lines(self.load(self.path('merged.json'))),
+            [1, 2, 3])
+        self.cover(self.path('a.json'), False)  # (<- merged with the file)
+        self.assertEqual(self.branchy_lines(self.load(self.path('a.json'))),
+                         [1, 2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()